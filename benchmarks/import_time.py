@@ -0,0 +1,122 @@
+"""
+Import-time benchmark of speechxai.
+
+Each statement is run in a fresh interpreter. We report the median wall time of the import,
+the slowest modules (python -X importtime) and the heavy optional dependencies that have been imported.
+With --max-seconds, the script fails if "import speechxai" is slower or imports a heavy dependency.
+
+Usage:
+    python benchmarks/import_time.py --repeat 5 --max-seconds 1.0
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Heavy dependencies that "import speechxai" should not import
+HEAVY_MODULES = [
+    "whisperx",
+    "captum",
+    "audiomentations",
+    "seaborn",
+    "pandas",
+    "IPython",
+    "ferret",
+    "datasets",
+    "transformers",
+    "lime",
+    "sklearn",
+    "torch",
+]
+
+STATEMENTS = [
+    "import speechxai",
+    "from speechxai import ModelHelperFSC",
+    "from speechxai import Benchmark",
+]
+
+CHILD_CODE = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy_modules!r} if name in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_child(code: str, importtime: bool = False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else [])
+    env = {**os.environ, "PYTHONPATH": REPOSITORY_DIR}
+    return subprocess.run(
+        command + ["-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=REPOSITORY_DIR,
+        env=env,
+    )
+
+
+def slowest_modules(statement: str, top_k: int):
+    """
+    Modules with the highest cumulative import time (in seconds), from python -X importtime
+    """
+    stderr = run_child(statement, importtime=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Only the top-level imports (the nested ones are included in the cumulative time)
+        if name.startswith(" ") and not name.startswith("  "):
+            modules.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(modules, reverse=True)[:top_k]
+
+
+def benchmark(statement: str, repeat: int):
+    times, heavy = [], ""
+    for _ in range(repeat):
+        code = CHILD_CODE.format(statement=statement, heavy_modules=HEAVY_MODULES)
+        # The last line of the output is printed by CHILD_CODE
+        elapsed, _, heavy = (
+            run_child(code).stdout.strip().splitlines()[-1].partition(" ")
+        )
+        times.append(float(elapsed))
+    return statistics.median(times), [name for name in heavy.split(",") if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=None,
+        help='Fail if "import speechxai" takes longer or imports a heavy dependency',
+    )
+    args = parser.parse_args()
+
+    failed = False
+    for statement in STATEMENTS:
+        median_time, heavy = benchmark(statement, args.repeat)
+        print(f"{statement}: {median_time:.3f} s (median of {args.repeat})")
+        print(f"    heavy dependencies imported: {', '.join(heavy) or '-'}")
+        for cumulative, name in slowest_modules(statement, args.top_k):
+            print(f"    {cumulative:8.3f} s  {name}")
+
+        if statement == STATEMENTS[0] and args.max_seconds is not None:
+            failed = median_time > args.max_seconds or len(heavy) > 0
+
+    if failed:
+        print(f'"import speechxai" is over the budget of {args.max_seconds} s')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
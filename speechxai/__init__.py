@@ -1,20 +1,43 @@
 """Top-level package for speechxai."""
+import importlib
 
+# The classes are imported at their first use, so that "import speechxai" does not import
+# the heavy dependencies of the explainers (e.g., whisperx, captum, audiomentations, pandas, seaborn)
+_LAZY_IMPORTS = {
+    "Benchmark": ".benchmark_speech",
+    # Benchmarking methods
+    "AOPC_Comprehensiveness_Evaluation_Speech": ".evaluators.faithfulness_measures_speech",
+    "AOPC_Sufficiency_Evaluation_Speech": ".evaluators.faithfulness_measures_speech",
+    # Explainers
+    "ParalinguisticSpeechExplainer": ".explainers.paraling_speech_explainer",
+    "LOOSpeechExplainer": ".explainers.loo_speech_explainer",
+    "PipelinedLOOExplainer": ".explainers.pipelined_explainer",
+    "HierarchicalOcclusionSpeechExplainer": ".explainers.hierarchical_occlusion_speech_explainer",
+    "ExplanationSpeech": ".explainers.explanation_speech",
+    # Audios
+    "LoadedAudio": ".audio_io",
+    "load_audio": ".audio_io",
+    # Model Helpers
+    "ModelHelperER": ".model_helpers.model_helper_er",
+    "ModelHelperFSC": ".model_helpers.model_helper_fsc",
+    "ModelHelperITALIC": ".model_helpers.model_helper_italic",
+    "PredictionCache": ".model_helpers.prediction_cache",
+    "ModelHelperPool": ".model_helpers.model_helper_pool",
+    "ModelHelperONNX": ".model_helpers.model_helper_onnx",
+    "export_onnx": ".model_helpers.model_helper_onnx",
+}
 
-from .benchmark_speech import Benchmark
+__all__ = list(_LAZY_IMPORTS)
 
-# Benchmarking methods
-from .evaluators.faithfulness_measures_speech import (
-    AOPC_Comprehensiveness_Evaluation_Speech,
-    AOPC_Sufficiency_Evaluation_Speech,
-)
 
-# Explainers
-from .explainers.paraling_speech_explainer import ParalinguisticSpeechExplainer
-from .explainers.loo_speech_explainer import LOOSpeechExplainer
-from .explainers.explanation_speech import ExplanationSpeech
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    # Next accesses do not go through __getattr__
+    globals()[name] = value
+    return value
 
-# Model Helpers
-from .model_helpers.model_helper_er import ModelHelperER
-from .model_helpers.model_helper_fsc import ModelHelperFSC
-from .model_helpers.model_helper_italic import ModelHelperITALIC
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
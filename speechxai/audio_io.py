@@ -0,0 +1,247 @@
+"""Audios decoded once and shared by the explainers and the evaluators"""
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, Union
+import numpy as np
+from pydub import AudioSegment
+
+# Number of decoded audios kept in memory (see load_audio)
+AUDIO_CACHE_SIZE = 16
+
+# WAV format codes (the extensible format has the code of the samples in its sub format)
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav_header(path: str) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Frame rate, number of channels, offset and size (in bytes) of the samples of a 16-bit PCM WAV file.
+    Returns None for the other formats (e.g., 24-bit, float, compressed).
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            return None
+
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                return None
+            chunk_id = chunk_header[:4]
+            chunk_size = struct.unpack("<I", chunk_header[4:])[0]
+
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                if len(fmt) < 16:
+                    return None
+                # Chunks are padded to an even size
+                f.seek(chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                offset = f.tell()
+                # Streamed WAV files may have a wrong size (e.g., 0xFFFFFFFF)
+                size = min(chunk_size, file_size - offset)
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+    audio_format, channels, frame_rate = struct.unpack("<HHI", fmt[:8])
+    bits_per_sample = struct.unpack("<H", fmt[14:16])[0]
+    if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        audio_format = struct.unpack("<H", fmt[24:26])[0]
+    if audio_format != WAVE_FORMAT_PCM or bits_per_sample != 16 or channels == 0:
+        return None
+    return frame_rate, channels, offset, size
+
+
+def mmap_wav(path: str) -> Optional[Tuple[np.ndarray, int]]:
+    """
+    Samples of a 16-bit PCM WAV file as a read-only np.int16 array of shape [n_samples, channels], memory-mapped on the file (no copy),
+    and the frame rate. Returns None if the file is not a 16-bit PCM WAV file.
+    """
+    header = read_wav_header(path)
+    if header is None:
+        return None
+    frame_rate, channels, offset, size = header
+    n_frames = size // (2 * channels)
+    if n_frames == 0:
+        return np.zeros((0, channels), dtype=np.int16), frame_rate
+    pcm = np.memmap(
+        path, dtype="<i2", mode="r", offset=offset, shape=(n_frames, channels)
+    )
+    return pcm, frame_rate
+
+
+def pcm_to_float32(pcm: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Converts integer PCM samples to np.float32 in range [-1.0, 1.0] (as utils.pydub_to_np), with a single allocation.
+    If out is given (a np.float32 array with at least pcm.size elements, e.g., reused across audios), the samples are written in it
+    and the returned array is a view of it.
+    """
+    scale = 1.0 / (1 << (8 * pcm.dtype.itemsize - 1))
+    if out is not None:
+        if out.dtype != np.float32 or out.size < pcm.size:
+            raise ValueError(
+                f"out must be a np.float32 array with at least {pcm.size} elements"
+            )
+        out = out.reshape(-1)[: pcm.size].reshape(pcm.shape)
+    return np.multiply(pcm, scale, out=out, dtype=np.float32)
+
+
+class LoadedAudio:
+    """
+    Audio decoded once: its samples, frame rate and content hash.
+    It can be passed in place of audio_path to the explainers, the evaluators and the model helpers.
+    The integer samples (pcm) of the 16-bit PCM WAV files are memory-mapped, and converted to np.float32 only when needed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        pcm: np.ndarray,
+        frame_rate: int,
+        segment: AudioSegment = None,
+    ):
+        """
+        Args:
+            path: path of the audio file
+            pcm: integer samples of shape [n_samples, channels]
+            frame_rate: sampling rate
+            segment: the audio as pydub.AudioSegment. If None, it is created from pcm at the first use
+        """
+        self.path = path
+        self.pcm = pcm
+        self.frame_rate = frame_rate
+        self.channels = pcm.shape[1]
+        self._segment = segment
+        self._samples = None
+        self._hash = None
+
+    @classmethod
+    def from_segment(cls, path: str, segment: AudioSegment) -> "LoadedAudio":
+        if segment.sample_width in (1, 2, 4):
+            pcm = np.frombuffer(segment.raw_data, dtype=f"<i{segment.sample_width}")
+        else:
+            pcm = np.array(segment.get_array_of_samples())
+        pcm = pcm.reshape((-1, segment.channels))
+        return cls(path, pcm, segment.frame_rate, segment)
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __len__(self) -> int:
+        return self.pcm.shape[0]
+
+    def __repr__(self) -> str:
+        return f"LoadedAudio({self.path!r}, frame_rate={self.frame_rate}, duration={self.duration:.3f}s)"
+
+    @property
+    def duration(self) -> float:
+        return len(self) / self.frame_rate
+
+    @property
+    def int16(self) -> np.ndarray:
+        """
+        Samples as np.int16 of shape [n_samples, channels], without copy (read-only)
+        """
+        if self.pcm.dtype != np.int16:
+            raise ValueError(f"{self.path} is not a 16-bit audio")
+        return self.pcm
+
+    @property
+    def segment(self) -> AudioSegment:
+        """
+        The audio as pydub.AudioSegment (e.g., for utils_removal.remove_word)
+        """
+        if self._segment is None:
+            self._segment = AudioSegment(
+                self.pcm.tobytes(),
+                sample_width=self.pcm.dtype.itemsize,
+                frame_rate=self.frame_rate,
+                channels=self.channels,
+            )
+        return self._segment
+
+    @property
+    def samples(self) -> np.ndarray:
+        """
+        Samples as np.float32 of shape [n_samples, channels], in range [-1.0, 1.0] (as utils.pydub_to_np).
+        The array is shared by all the users of the audio, so it is read-only
+        """
+        if self._samples is None:
+            samples = pcm_to_float32(self.pcm)
+            samples.flags.writeable = False
+            self._samples = samples
+        return self._samples
+
+    def to_float32(self, out: np.ndarray = None) -> np.ndarray:
+        """
+        Samples as np.float32 (see samples), written in out if given (see pcm_to_float32).
+        With a buffer reused across audios, the float samples of long audios are not allocated for each audio.
+        """
+        if out is None and self._samples is not None:
+            return self._samples.copy()
+        return pcm_to_float32(self.pcm, out)
+
+    @property
+    def hash(self) -> str:
+        """
+        Hash of the content of the file (as transcript_store.get_file_hash)
+        """
+        if self._hash is None:
+            from speechxai.explainers.transcript_store import get_file_hash
+
+            self._hash = get_file_hash(self.path)
+        return self._hash
+
+
+def read_audio(audio_path: str) -> LoadedAudio:
+    """
+    Reads a WAV file, memory-mapping the 16-bit PCM files (see mmap_wav) and decoding the others with pydub.
+    """
+    mapped = mmap_wav(audio_path)
+    if mapped is not None:
+        return LoadedAudio(audio_path, *mapped)
+    return LoadedAudio.from_segment(audio_path, AudioSegment.from_wav(audio_path))
+
+
+_AUDIO_CACHE = OrderedDict()
+_AUDIO_CACHE_LOCK = threading.Lock()
+
+
+def load_audio(audio: Union[str, LoadedAudio]) -> LoadedAudio:
+    """
+    Decoded audio of a WAV file (see read_audio). The last AUDIO_CACHE_SIZE audios are cached by path and modification time,
+    so that an audio is decoded once by all the explainers and evaluators of a job. A LoadedAudio is returned as is.
+    """
+    if isinstance(audio, LoadedAudio):
+        return audio
+
+    stat = os.stat(audio)
+    key = (os.path.abspath(audio), stat.st_mtime_ns, stat.st_size)
+    with _AUDIO_CACHE_LOCK:
+        if key in _AUDIO_CACHE:
+            _AUDIO_CACHE.move_to_end(key)
+            return _AUDIO_CACHE[key]
+
+    loaded_audio = read_audio(audio)
+
+    with _AUDIO_CACHE_LOCK:
+        _AUDIO_CACHE[key] = loaded_audio
+        while len(_AUDIO_CACHE) > AUDIO_CACHE_SIZE:
+            _AUDIO_CACHE.popitem(last=False)
+    return loaded_audio
+
+
+def get_audio_path(audio: Union[str, LoadedAudio]) -> str:
+    return audio.path if isinstance(audio, LoadedAudio) else audio
+
+
+def clear_audio_cache():
+    with _AUDIO_CACHE_LOCK:
+        _AUDIO_CACHE.clear()
@@ -1,31 +1,39 @@
 import numpy as np
-from typing import Dict, List, Union, Tuple
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Union, Tuple
 from pydub import AudioSegment
-import pandas as pd
 import torch
-import seaborn as sns
 from speechxai.explainers.explanation_speech import ExplanationSpeech
-from speechxai.utils import pydub_to_np, print_log
+from speechxai.utils import pydub_to_np, print_log, set_seed
+from speechxai.audio_io import LoadedAudio, load_audio
 
-SCORES_PALETTE = sns.diverging_palette(240, 10, as_cmap=True)
-from IPython.display import display
+if TYPE_CHECKING:
+    import pandas as pd
 
 from speechxai.explainers.loo_speech_explainer import LOOSpeechExplainer
+from speechxai.explainers.hierarchical_occlusion_speech_explainer import (
+    HierarchicalOcclusionSpeechExplainer,
+)
 from speechxai.explainers.gradient_speech_explainer import GradientSpeechExplainer
 from speechxai.explainers.lime_speech_explainer import LIMESpeechExplainer
 from speechxai.explainers.paraling_speech_explainer import ParalinguisticSpeechExplainer
 
-## Set seed
+## Seed, set when the Benchmark is created (not at import time)
 SEED = 42
-torch.manual_seed(SEED)
-torch.cuda.manual_seed(SEED)
-np.random.seed(SEED)
 # If True, We use the add_noise of torch audio
 USE_ADD_NOISE_TORCHAUDIO = True
 
 REFERENCE_STR = "-"
 
 
+@lru_cache(maxsize=None)
+def get_scores_palette():
+    # seaborn is imported only to show the tables
+    import seaborn as sns
+
+    return sns.diverging_palette(240, 10, as_cmap=True)
+
+
 class Benchmark:
     def __init__(
         self,
@@ -34,37 +42,62 @@ class Benchmark:
         device: str = "cuda:0",
         language: str = "en",
         explainers=None,
+        model_helper_args: Dict = None,
+        seed: int = SEED,
     ):
+        """
+        Args:
+            model_helper_args: additional arguments of the model helper (e.g., batch_inference=True to predict the audios in batches)
+            seed: seed of torch and numpy. If None, the seed is not set
+        """
+        if seed is not None:
+            set_seed(seed)
         self.model = model
         self.feature_extractor = feature_extractor
         self.model.eval()
         self.device = torch.device(device if torch.cuda.is_available() else "cpu")
+        model_helper_args = {} if model_helper_args is None else model_helper_args
 
         if "superb-ic" in self.model.name_or_path:
             # We are using the FSC model - It has three output classes
             from .model_helpers.model_helper_fsc import ModelHelperFSC
 
             self.model_helper = ModelHelperFSC(
-                self.model, self.feature_extractor, self.device, "en"
+                self.model,
+                self.feature_extractor,
+                self.device,
+                "en",
+                **model_helper_args,
             )
         elif "ITALIC" in self.model.name_or_path:
             from .model_helpers.model_helper_italic import ModelHelperITALIC
 
             self.model_helper = ModelHelperITALIC(
-                self.model, self.feature_extractor, self.device, "it"
+                self.model,
+                self.feature_extractor,
+                self.device,
+                "it",
+                **model_helper_args,
             )
         else:
             # We are using the ER model - It has one output class
             from .model_helpers.model_helper_er import ModelHelperER
 
             self.model_helper = ModelHelperER(
-                self.model, self.feature_extractor, self.device, language
+                self.model,
+                self.feature_extractor,
+                self.device,
+                language,
+                **model_helper_args,
             )
 
         if explainers is None:
             # Use the default explainers
             self.explainers = {
                 "LOO": LOOSpeechExplainer(self.model_helper),
+                "HierarchicalLOO": HierarchicalOcclusionSpeechExplainer(
+                    self.model_helper
+                ),
                 "Gradient": GradientSpeechExplainer(
                     self.model_helper, multiply_by_inputs=False
                 ),
@@ -88,7 +121,7 @@ class Benchmark:
 
     def explain(
         self,
-        audio_path: str,
+        audio_path: Union[str, LoadedAudio],
         target_class: str = None,
         methodology: str = "LOO",
         perturbation_types: List[str] = [
@@ -101,7 +134,8 @@ class Benchmark:
             "reverberation",
             "noise",
         ],
-        removal_type: str = "silence",  # Used only for LOO and LIME - explainer_args TODO
+        # Used only for LOO (one or more removal types) and LIME - explainer_args TODO
+        removal_type: Union[str, List[str]] = "silence",
         aggregation: str = "mean",  # Used only for Gradient and GradientXInput - explainer_args TODO
         num_samples: int = 1000,  # Used only for LIME - explainer_args TODO
         words_trascript: List = None,
@@ -111,10 +145,15 @@ class Benchmark:
         """
         Explain the prediction of the model.
         Returns the importance of each segment in the audio.
+        For LOO, removal_type can be a list of removal types: the audio is decoded, aligned and predicted once,
+        and one explanation per removal type is returned.
         """
         explainer_args = {}
         # TODO UNIFY THE INPUT FORMAT
 
+        # The audio is decoded once and shared by the explainers (see audio_io.load_audio)
+        audio_path = load_audio(audio_path)
+
         ## Get the importance of each class (action, object, location) according to the perturb_paraling type
         if methodology == "perturb_paraling":
             explanations = []
@@ -136,11 +175,20 @@ class Benchmark:
         else:
             if methodology not in self.explainers:
                 raise ValueError(
-                    f'Explainer {methodology} not supported. Choose between "LOO", "Gradient", "GradientXInput", "LIME", "perturb_paraling"'
+                    f'Explainer {methodology} not supported. Choose between "LOO", "HierarchicalLOO", "Gradient", "GradientXInput", "LIME", "perturb_paraling"'
                 )
             if "LOO" in methodology:
+                # HierarchicalLOO takes a single removal type
+                if isinstance(removal_type, (list, tuple)) and methodology != "LOO":
+                    raise ValueError(
+                        "Multiple removal types are supported only for LOO"
+                    )
                 explainer_args["removal_type"] = removal_type
             elif "LIME" in methodology:
+                if isinstance(removal_type, (list, tuple)):
+                    raise ValueError(
+                        "Multiple removal types are supported only for LOO"
+                    )
                 explainer_args["removal_type"] = removal_type
                 explainer_args["num_samples"] = num_samples
             else:
@@ -162,7 +210,7 @@ class Benchmark:
         self,
         explanations,
         axis=1,  # append the scores to the columns
-    ) -> pd.DataFrame:
+    ) -> "pd.DataFrame":
         """
         Args:
             explanations: list of explanations or single explanation
@@ -170,6 +218,7 @@ class Benchmark:
         Creates a table with the words or paralinguistic feature(s),
         and the difference p(y|x\F) - p(y|x) for each class.
         """
+        import pandas as pd
 
         if type(explanations) == list:
             if axis == 1:
@@ -221,6 +270,8 @@ class Benchmark:
         return importance_df
 
     def show_table(self, explanations, apply_style: bool = True, decimals=4):
+        import pandas as pd
+
         # Rename duplicate columns (tokens) by adding a suffix
         table = self.create_table(explanations)
 
@@ -231,7 +282,9 @@ class Benchmark:
 
         return (
             table.apply(pd.to_numeric)
-            .style.background_gradient(axis=1, cmap=SCORES_PALETTE, vmin=-1, vmax=1)
+            .style.background_gradient(
+                axis=1, cmap=get_scores_palette(), vmin=-1, vmax=1
+            )
             .format(precision=decimals)
             if apply_style
             else table.apply(pd.to_numeric).style.format(precision=decimals)
@@ -1,16 +1,12 @@
 import numpy as np
-from speechxai.utils import pydub_to_np
-from pydub import AudioSegment
 import warnings
-from ferret.evaluators.utils_from_soft_to_discrete import (
-    parse_evaluator_args,
-    _check_and_define_get_id_discrete_rationale_function,
-)
 from speechxai.explainers.explanation_speech import ExplanationSpeech, EvaluationSpeech
-from speechxai.explainers.utils_removal import remove_specified_words
-
-from IPython.display import display
-from ferret.evaluators.faithfulness_measures import _compute_aopc
+from speechxai.explainers.perturbations import (
+    SpanPerturbation,
+    predict_perturbed_audios,
+)
+from speechxai.audio_io import load_audio
+from speechxai.model_helpers.utils_inference import incremental_reference
 from typing import List
 
 
@@ -42,6 +38,12 @@ class AOPC_Comprehensiveness_Evaluation_Speech:
             Evaluation : the AOPC Comprehensiveness score of the explanation
         """
 
+        from ferret.evaluators.utils_from_soft_to_discrete import (
+            parse_evaluator_args,
+            _check_and_define_get_id_discrete_rationale_function,
+        )
+        from ferret.evaluators.faithfulness_measures import _compute_aopc
+
         _, only_pos, removal_args, _ = parse_evaluator_args(evaluation_args)
 
         assert (
@@ -64,9 +66,9 @@ class AOPC_Comprehensiveness_Evaluation_Speech:
 
         target = explanation.target
 
-        # Get the audio from audio_path
-        audio = AudioSegment.from_wav(audio_path)
-        audio_np = pydub_to_np(audio)[0]
+        # Get the audio from audio_path (decoded once, see audio_io.load_audio)
+        loaded_audio = load_audio(audio_path)
+        audio_np = loaded_audio.samples
 
         # Get prediction probability of the input sencence for the target
         ground_truth_probs = self.model_helper.predict([audio_np])
@@ -82,15 +84,13 @@ class AOPC_Comprehensiveness_Evaluation_Speech:
             ground_truth_probs_target = [ground_truth_probs[0][target[0]]]
 
         # Splite the audio into word-level audio segments
-        from speechxai.explainers.loo_speech_explainer import transcribe_audio
+        from speechxai.explainers.alignment_providers import get_word_alignment
 
         if words_trascript is None:
-            text, words_trascript = transcribe_audio(
-                audio_path=audio_path,
-                device=self.model_helper.device.type,
-                batch_size=2,
-                compute_type="float32",
+            text, words_trascript = get_word_alignment(
+                audio_path=loaded_audio.path,
                 language=self.model_helper.language,
+                device=self.model_helper.device.type,
             )
 
         get_discrete_rationale_function = (
@@ -113,80 +113,91 @@ class AOPC_Comprehensiveness_Evaluation_Speech:
 
         aopc_comprehesiveness_multi_label = list()
 
-        # We iterate over the target classes for a multi-label setting
-        # In the case of single label, we iterate only once
-        for target_class_idx, score_explanation in enumerate(score_explanations):
-            removal_importances = list()
-            id_tops = list()
-            last_id_top = None
-
-            # Ground truth probabilities of the target label (target_class_idx) and target class (target[target_class_idx]])
-            # It is the output probability of the target class itself in the case of single label
-            original_prob = ground_truth_probs_target[target_class_idx]
-
-            # We compute the difference between in probability for all the thresholds
-            for v in thresholds:
-                # Get rationale from score explanation
-                id_top = get_discrete_rationale_function(score_explanation, v, only_pos)
-
-                # If the rationale is the same, we do not include it. In this way, we will not consider in the average the same omission.
-                if (
-                    id_top is not None
-                    and last_id_top is not None
-                    and set(id_top) == last_id_top
-                ):
-                    id_top = None
-
-                id_tops.append(id_top)
-
-                if id_top is None:
-                    continue
-
-                last_id_top = set(id_top)
-
-                id_top.sort()
-
-                # Comprehensiveness
-                # The only difference between comprehesivenss and sufficiency is the computation of the removal.
-
-                # For the comprehensiveness: we remove the terms in the discrete rationale.
-
-                words_removed = [words_trascript[i] for i in id_top]
-
-                audio_removed = remove_specified_words(
-                    audio, words_removed, removal_type=removal_type
+        # With incremental encoding, only the frames of the removed words are recomputed (not for the removal type "nothing")
+        with incremental_reference(self.model_helper, audio_np):
+            # We iterate over the target classes for a multi-label setting
+            # In the case of single label, we iterate only once
+            for target_class_idx, score_explanation in enumerate(score_explanations):
+                perturbations = list()
+                id_tops = list()
+                last_id_top = None
+
+                # Ground truth probabilities of the target label (target_class_idx) and target class (target[target_class_idx]])
+                # It is the output probability of the target class itself in the case of single label
+                original_prob = ground_truth_probs_target[target_class_idx]
+
+                # We compute the difference between in probability for all the thresholds
+                for v in thresholds:
+                    # Get rationale from score explanation
+                    id_top = get_discrete_rationale_function(
+                        score_explanation, v, only_pos
+                    )
+
+                    # If the rationale is the same, we do not include it. In this way, we will not consider in the average the same omission.
+                    if (
+                        id_top is not None
+                        and last_id_top is not None
+                        and set(id_top) == last_id_top
+                    ):
+                        id_top = None
+
+                    id_tops.append(id_top)
+
+                    if id_top is None:
+                        continue
+
+                    last_id_top = set(id_top)
+
+                    id_top.sort()
+
+                    # Comprehensiveness
+                    # The only difference between comprehesivenss and sufficiency is the computation of the removal.
+
+                    # For the comprehensiveness: we remove the terms in the discrete rationale.
+
+                    words_removed = [words_trascript[i] for i in id_top]
+
+                    # All the words are removed in one pass on the waveform, when the audio is materialized for inference
+                    perturbations.append(
+                        SpanPerturbation.from_words(
+                            audio_np,
+                            words_removed,
+                            removal_type=removal_type,
+                            sampling_rate=loaded_audio.frame_rate,
+                        )
+                    )
+
+                if perturbations == []:
+                    return EvaluationSpeech(self.SHORT_NAME, 0, target)
+
+                # Probability of the modified audios, materialized in batches
+                audio_modified_probs = predict_perturbed_audios(
+                    self.model_helper, perturbations
                 )
 
-                audio_removed_np = pydub_to_np(audio_removed)[0]
-
-                # Probability of the modified audio
-                audio_modified_probs = self.model_helper.predict([audio_removed_np])
-
-                # Probability of the target class (and label) for the modified audio
+                # Probability of the target class (and label) for the modified audios
                 if self.model_helper.n_labels > 1:
                     # In the multi-label setting, we have a list of probabilities for each label
 
                     # We first take the probability of the corresponding target label target_class_idx
                     # Then we take the probability of the target class for that label target[target_class_idx]
-                    modified_prob = audio_modified_probs[target_class_idx][
+                    modified_probs = audio_modified_probs[target_class_idx][
                         :, target[target_class_idx]
-                    ][0]
+                    ]
 
                 else:
                     # Single probability
                     # We take the probability of the target class target[target_class_idx]
-                    modified_prob = audio_modified_probs[0][target[target_class_idx]]
+                    modified_probs = audio_modified_probs[:, target[target_class_idx]]
 
                 # compute probability difference
-                removal_importance = original_prob - modified_prob
-                removal_importances.append(removal_importance)
-
-            if removal_importances == []:
-                return EvaluationSpeech(self.SHORT_NAME, 0, target)
+                removal_importances = [
+                    original_prob - modified_prob for modified_prob in modified_probs
+                ]
 
-            #  compute AOPC comprehensiveness
-            aopc_comprehesiveness = _compute_aopc(removal_importances)
-            aopc_comprehesiveness_multi_label.append(aopc_comprehesiveness)
+                #  compute AOPC comprehensiveness
+                aopc_comprehesiveness = _compute_aopc(removal_importances)
+                aopc_comprehesiveness_multi_label.append(aopc_comprehesiveness)
 
         evaluation_output = EvaluationSpeech(
             self.SHORT_NAME, aopc_comprehesiveness_multi_label, target
@@ -223,6 +234,12 @@ class AOPC_Sufficiency_Evaluation_Speech:
             Evaluation : the AOPC Sufficiency score of the explanation
         """
 
+        from ferret.evaluators.utils_from_soft_to_discrete import (
+            parse_evaluator_args,
+            _check_and_define_get_id_discrete_rationale_function,
+        )
+        from ferret.evaluators.faithfulness_measures import _compute_aopc
+
         _, only_pos, removal_args, _ = parse_evaluator_args(evaluation_args)
 
         assert (
@@ -245,9 +262,9 @@ class AOPC_Sufficiency_Evaluation_Speech:
 
         target = explanation.target
 
-        # Get the audio from audio_path
-        audio = AudioSegment.from_wav(audio_path)
-        audio_np = pydub_to_np(audio)[0]
+        # Get the audio from audio_path (decoded once, see audio_io.load_audio)
+        loaded_audio = load_audio(audio_path)
+        audio_np = loaded_audio.samples
 
         # Get prediction probability of the input sencence for the target
         ground_truth_probs = self.model_helper.predict([audio_np])
@@ -263,15 +280,13 @@ class AOPC_Sufficiency_Evaluation_Speech:
             ground_truth_probs_target = [ground_truth_probs[0][target[0]]]
 
         # Splite the audio into word-level audio segments
-        from speechxai.explainers.loo_speech_explainer import transcribe_audio
+        from speechxai.explainers.alignment_providers import get_word_alignment
 
         if words_trascript is None:
-            text, words_trascript = transcribe_audio(
-                audio_path=audio_path,
-                device=self.model_helper.device.type,
-                batch_size=2,
-                compute_type="float32",
+            text, words_trascript = get_word_alignment(
+                audio_path=loaded_audio.path,
                 language=self.model_helper.language,
+                device=self.model_helper.device.type,
             )
 
         get_discrete_rationale_function = (
@@ -294,84 +309,95 @@ class AOPC_Sufficiency_Evaluation_Speech:
 
         aopc_comprehesiveness_multi_label = list()
 
-        # We iterate over the target classes for a multi-label setting
-        # In the case of single label, we iterate only once
-        for target_class_idx, score_explanation in enumerate(score_explanations):
-            removal_importances = list()
-            id_tops = list()
-            last_id_top = None
-
-            # Ground truth probabilities of the target label (target_class_idx) and target class (target[target_class_idx]])
-            # It is the output probability of the target class itself in the case of single label
-            original_prob = ground_truth_probs_target[target_class_idx]
-
-            # We compute the difference between in probability for all the thresholds
-            for v in thresholds:
-                # Get rationale from score explanation
-                id_top = get_discrete_rationale_function(score_explanation, v, only_pos)
-
-                # If the rationale is the same, we do not include it. In this way, we will not consider in the average the same omission.
-                if (
-                    id_top is not None
-                    and last_id_top is not None
-                    and set(id_top) == last_id_top
-                ):
-                    id_top = None
-
-                id_tops.append(id_top)
-
-                if id_top is None:
-                    continue
-
-                last_id_top = set(id_top)
-
-                id_top.sort()
-
-                # Sufficiency
-                # The only difference between comprehesivenss and sufficiency is the computation of the removal.
-
-                # For the sufficiency: we keep only the terms in the discrete rationale.
-                # Hence, we remove all the other terms.
-                words_removed = [
-                    words_trascript[i]
-                    for i in range(len(words_trascript))
-                    if i not in id_top
-                ]
-
-                audio_removed = remove_specified_words(
-                    audio, words_removed, removal_type=removal_type
+        # With incremental encoding, only the frames of the removed words are recomputed (not for the removal type "nothing")
+        with incremental_reference(self.model_helper, audio_np):
+            # We iterate over the target classes for a multi-label setting
+            # In the case of single label, we iterate only once
+            for target_class_idx, score_explanation in enumerate(score_explanations):
+                perturbations = list()
+                id_tops = list()
+                last_id_top = None
+
+                # Ground truth probabilities of the target label (target_class_idx) and target class (target[target_class_idx]])
+                # It is the output probability of the target class itself in the case of single label
+                original_prob = ground_truth_probs_target[target_class_idx]
+
+                # We compute the difference between in probability for all the thresholds
+                for v in thresholds:
+                    # Get rationale from score explanation
+                    id_top = get_discrete_rationale_function(
+                        score_explanation, v, only_pos
+                    )
+
+                    # If the rationale is the same, we do not include it. In this way, we will not consider in the average the same omission.
+                    if (
+                        id_top is not None
+                        and last_id_top is not None
+                        and set(id_top) == last_id_top
+                    ):
+                        id_top = None
+
+                    id_tops.append(id_top)
+
+                    if id_top is None:
+                        continue
+
+                    last_id_top = set(id_top)
+
+                    id_top.sort()
+
+                    # Sufficiency
+                    # The only difference between comprehesivenss and sufficiency is the computation of the removal.
+
+                    # For the sufficiency: we keep only the terms in the discrete rationale.
+                    # Hence, we remove all the other terms.
+                    words_removed = [
+                        words_trascript[i]
+                        for i in range(len(words_trascript))
+                        if i not in id_top
+                    ]
+
+                    # All the words are removed in one pass on the waveform, when the audio is materialized for inference
+                    perturbations.append(
+                        SpanPerturbation.from_words(
+                            audio_np,
+                            words_removed,
+                            removal_type=removal_type,
+                            sampling_rate=loaded_audio.frame_rate,
+                        )
+                    )
+
+                if perturbations == []:
+                    return EvaluationSpeech(self.SHORT_NAME, 0, target)
+
+                # Probability of the modified audios, materialized in batches
+                audio_modified_probs = predict_perturbed_audios(
+                    self.model_helper, perturbations
                 )
 
-                audio_removed_np = pydub_to_np(audio_removed)[0]
-
-                # Probability of the modified audio
-                audio_modified_probs = self.model_helper.predict([audio_removed_np])
-
-                # Probability of the target class (and label) for the modified audio
+                # Probability of the target class (and label) for the modified audios
                 if self.model_helper.n_labels > 1:
                     # In the multi-label setting, we have a list of probabilities for each label
 
                     # We first take the probability of the corresponding target label target_class_idx
                     # Then we take the probability of the target class for that label target[target_class_idx]
-                    modified_prob = audio_modified_probs[target_class_idx][
+                    modified_probs = audio_modified_probs[target_class_idx][
                         :, target[target_class_idx]
-                    ][0]
+                    ]
 
                 else:
                     # Single probability
                     # We take the probability of the target class target[target_class_idx]
-                    modified_prob = audio_modified_probs[0][target[target_class_idx]]
+                    modified_probs = audio_modified_probs[:, target[target_class_idx]]
 
                 # compute probability difference
-                removal_importance = original_prob - modified_prob
-                removal_importances.append(removal_importance)
-
-            if removal_importances == []:
-                return EvaluationSpeech(self.SHORT_NAME, 0, target)
+                removal_importances = [
+                    original_prob - modified_prob for modified_prob in modified_probs
+                ]
 
-            #  compute AOPC comprehensiveness
-            aopc_comprehesiveness = _compute_aopc(removal_importances)
-            aopc_comprehesiveness_multi_label.append(aopc_comprehesiveness)
+                #  compute AOPC comprehensiveness
+                aopc_comprehesiveness = _compute_aopc(removal_importances)
+                aopc_comprehesiveness_multi_label.append(aopc_comprehesiveness)
 
         evaluation_output = EvaluationSpeech(
             self.SHORT_NAME, aopc_comprehesiveness_multi_label, target
@@ -0,0 +1,329 @@
+"""Providers of the word-level alignments of the audios (precomputed or by whisperx)"""
+import json
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+Words = List[Dict[str, Union[str, float]]]
+
+# Labels of the non-word intervals of forced aligners (e.g., Montreal Forced Aligner, Kaldi)
+NON_WORD_LABELS = {"", "sil", "sp", "spn", "<sil>", "<eps>", "<unk>"}
+
+
+def get_audio_key(audio_path: str) -> str:
+    """
+    Default key of an audio in the alignment files: the file name without extension (e.g., the utterance id of a CTM file)
+    """
+    return os.path.splitext(os.path.basename(audio_path))[0]
+
+
+def _transcript(words: Words) -> Tuple[str, Words]:
+    return " ".join(word["word"] for word in words), words
+
+
+class AlignmentProvider:
+    """
+    Provides the text and the words with their start and end times (in seconds) of an audio,
+    in the format of utils_removal.transcribe_audio: [{"word": str, "start": float, "end": float}, ...]
+    """
+
+    def get_transcript(
+        self, audio_path: str, language: str = None, device: str = None
+    ) -> Optional[Tuple[str, Words]]:
+        """
+        Returns None if the provider has no alignment for the audio.
+        """
+        raise NotImplementedError()
+
+
+class AlignmentIndex(AlignmentProvider):
+    """
+    In-memory index from the audios to their alignments.
+    An audio is looked up by its (absolute) path and then by its key (by default, the file name without extension).
+    """
+
+    def __init__(self, key_function: Callable[[str], str] = get_audio_key):
+        self.key_function = key_function
+        self._words = {}
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __contains__(self, audio_path: str) -> bool:
+        return self._lookup(audio_path) is not None
+
+    def add(self, audio_path_or_key: str, words: Words):
+        self._words[audio_path_or_key] = words
+
+    def _lookup(self, audio_path: str) -> Optional[Words]:
+        for key in (
+            audio_path,
+            os.path.abspath(audio_path),
+            self.key_function(audio_path),
+        ):
+            if key in self._words:
+                return self._words[key]
+        return None
+
+    def get_transcript(
+        self, audio_path: str, language: str = None, device: str = None
+    ) -> Optional[Tuple[str, Words]]:
+        words = self._lookup(audio_path)
+        return None if words is None else _transcript(words)
+
+
+def _words_from_json(data) -> Words:
+    """
+    Words of a JSON alignment: a list of words, {"words": [...]} or the output of whisperx ({"segments": [{"words": [...]}, ...]})
+    """
+    if isinstance(data, dict) and "segments" in data:
+        words = [word for segment in data["segments"] for word in segment["words"]]
+    elif isinstance(data, dict):
+        words = data["words"]
+    else:
+        words = data
+    # Remove words that are not aligned (as in utils_removal.transcribe_audio)
+    return [
+        {**word, "start": float(word["start"]), "end": float(word["end"])}
+        for word in words
+        if "start" in word
+    ]
+
+
+def read_ctm(ctm_path: str) -> Dict[str, Words]:
+    """
+    Words of each utterance of a CTM file (lines: <utterance> <channel> <start> <duration> <word> [<confidence>])
+    """
+    words_by_utterance = {}
+    with open(ctm_path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 5 or line.startswith(";;"):
+                continue
+            utterance, _, start, duration, word = fields[:5]
+            words = words_by_utterance.setdefault(utterance, [])
+            if word.lower() in NON_WORD_LABELS:
+                continue
+            start = float(start)
+            words.append(
+                {"word": word, "start": start, "end": round(start + float(duration), 6)}
+            )
+    return words_by_utterance
+
+
+def read_textgrid(textgrid_path: str, tier_name: str = "words") -> Words:
+    """
+    Words of the interval tier tier_name of a Praat TextGrid file (long or short text format)
+    """
+    with open(textgrid_path, encoding="utf-8-sig") as f:
+        content = f.read()
+
+    # The long and the short formats have the same sequence of strings and numbers, except for the item indexes (e.g., "intervals [1]:")
+    content = re.sub(r"\[\d+\]", "", content)
+    tokens = [
+        token[1:-1].replace('""', '"') if token.startswith('"') else float(token)
+        for token in re.findall(
+            r'"(?:[^"]|"")*"|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?', content
+        )
+    ]
+
+    # File type, object class, xmin, xmax, number of tiers
+    position = 5
+    n_tiers = int(tokens[4])
+    for _ in range(n_tiers):
+        tier_class, name, _, _, size = tokens[position : position + 5]
+        position += 5
+        # Interval tiers: xmin, xmax, text. Point tiers: time, mark
+        n_fields = 3 if tier_class == "IntervalTier" else 2
+        if tier_class == "IntervalTier" and name == tier_name:
+            intervals = tokens[position : position + 3 * int(size)]
+            return [
+                {"word": text.strip(), "start": start, "end": end}
+                for start, end, text in zip(
+                    intervals[0::3], intervals[1::3], intervals[2::3]
+                )
+                if text.strip().lower() not in NON_WORD_LABELS
+            ]
+        position += n_fields * int(size)
+    raise ValueError(f"No interval tier {tier_name} in {textgrid_path}")
+
+
+class FileAlignmentProvider(AlignmentProvider):
+    """
+    One alignment file for each audio, with the same name of the audio and the given extension,
+    in directory or, if directory is None, next to the audio.
+    """
+
+    def __init__(
+        self,
+        read_function: Callable[[str], Words],
+        extension: str,
+        directory: str = None,
+        key_function: Callable[[str], str] = get_audio_key,
+    ):
+        self.read_function = read_function
+        self.extension = extension
+        self.directory = directory
+        self.key_function = key_function
+
+    def get_alignment_path(self, audio_path: str) -> str:
+        directory = (
+            self.directory
+            if self.directory is not None
+            else os.path.dirname(audio_path)
+        )
+        return os.path.join(directory, self.key_function(audio_path) + self.extension)
+
+    def get_transcript(
+        self, audio_path: str, language: str = None, device: str = None
+    ) -> Optional[Tuple[str, Words]]:
+        alignment_path = self.get_alignment_path(audio_path)
+        if not os.path.exists(alignment_path):
+            return None
+        return _transcript(self.read_function(alignment_path))
+
+
+class JSONAlignmentProvider(FileAlignmentProvider):
+    """
+    Alignments in JSON: one file per audio (e.g., the saved output of whisperx)
+    """
+
+    def __init__(
+        self,
+        directory: str = None,
+        key_function: Callable[[str], str] = get_audio_key,
+    ):
+        def read_json(json_path):
+            with open(json_path) as f:
+                return _words_from_json(json.load(f))
+
+        super().__init__(read_json, ".json", directory, key_function)
+
+
+class TextGridAlignmentProvider(FileAlignmentProvider):
+    """
+    Alignments in Praat TextGrid: one file per audio (e.g., the output of the Montreal Forced Aligner)
+    """
+
+    def __init__(
+        self,
+        directory: str = None,
+        tier_name: str = "words",
+        key_function: Callable[[str], str] = get_audio_key,
+    ):
+        super().__init__(
+            lambda textgrid_path: read_textgrid(textgrid_path, tier_name),
+            ".TextGrid",
+            directory,
+            key_function,
+        )
+
+
+def load_ctm_index(
+    ctm_path: str, key_function: Callable[[str], str] = get_audio_key
+) -> AlignmentIndex:
+    """
+    Index of the alignments of a CTM file, by utterance id
+    """
+    index = AlignmentIndex(key_function)
+    for utterance, words in read_ctm(ctm_path).items():
+        index.add(utterance, words)
+    return index
+
+
+def load_json_index(
+    json_path: str, key_function: Callable[[str], str] = get_audio_key
+) -> AlignmentIndex:
+    """
+    Index of the alignments of a JSON file mapping each audio path (or key) to its alignment
+    """
+    with open(json_path) as f:
+        alignments = json.load(f)
+    index = AlignmentIndex(key_function)
+    for audio_path_or_key, alignment in alignments.items():
+        index.add(audio_path_or_key, _words_from_json(alignment))
+    return index
+
+
+class WhisperXAlignmentProvider(AlignmentProvider):
+    """
+    Transcription and alignment with whisperx (see utils_removal.transcribe_audio)
+    """
+
+    def __init__(
+        self,
+        model_name_whisper: str = "large-v2",
+        compute_type: str = "float32",
+        batch_size: int = 2,
+    ):
+        self.model_name_whisper = model_name_whisper
+        self.compute_type = compute_type
+        self.batch_size = batch_size
+
+    def get_transcript(
+        self, audio_path: str, language: str = "en", device: str = "cuda"
+    ) -> Optional[Tuple[str, Words]]:
+        from speechxai.explainers.utils_removal import transcribe_audio
+
+        return transcribe_audio(
+            audio_path=audio_path,
+            device=device,
+            batch_size=self.batch_size,
+            compute_type=self.compute_type,
+            language=language,
+            model_name_whisper=self.model_name_whisper,
+        )
+
+
+class ChainAlignmentProvider(AlignmentProvider):
+    """
+    The alignment of the first provider that has one for the audio.
+    E.g., ChainAlignmentProvider([TextGridAlignmentProvider(directory), WhisperXAlignmentProvider()]) uses whisperx only for the audios without a TextGrid.
+    """
+
+    def __init__(self, providers: List[AlignmentProvider]):
+        self.providers = providers
+
+    def get_transcript(
+        self, audio_path: str, language: str = None, device: str = None
+    ) -> Optional[Tuple[str, Words]]:
+        for provider in self.providers:
+            transcript = provider.get_transcript(
+                audio_path, language=language, device=device
+            )
+            if transcript is not None:
+                return transcript
+        return None
+
+
+# Provider used by the explainers and the evaluators when the words are not given (see get_word_alignment)
+_ALIGNMENT_PROVIDER = WhisperXAlignmentProvider()
+
+
+def get_alignment_provider() -> AlignmentProvider:
+    return _ALIGNMENT_PROVIDER
+
+
+def set_alignment_provider(provider: AlignmentProvider):
+    """
+    Set the provider of the word alignments of the process.
+    E.g., set_alignment_provider(TextGridAlignmentProvider(directory)) to never transcribe the audios with whisperx
+    """
+    global _ALIGNMENT_PROVIDER
+    _ALIGNMENT_PROVIDER = provider
+
+
+def get_word_alignment(
+    audio_path: str, language: str = "en", device: str = "cuda"
+) -> Tuple[str, Words]:
+    """
+    Text and words with their start and end times of the audio, from the alignment provider of the process (by default, whisperx)
+    """
+    transcript = _ALIGNMENT_PROVIDER.get_transcript(
+        audio_path, language=language, device=device
+    )
+    if transcript is None:
+        raise ValueError(
+            f"No word alignment for {audio_path}. Pass words_trascript or add a provider for it (see set_alignment_provider)"
+        )
+    return transcript
@@ -0,0 +1,209 @@
+"""Word segmentation by CTC forced alignment of a known transcript"""
+import os
+import numpy as np
+import torch
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from speechxai.utils import pydub_to_np
+from speechxai.audio_io import load_audio
+from speechxai.explainers.alignment_providers import (
+    AlignmentProvider,
+    Words,
+    get_audio_key,
+)
+
+# Default CTC checkpoint (English characters). Any local Wav2Vec2ForCTC checkpoint with a character vocabulary can be used
+DEFAULT_CTC_MODEL = "facebook/wav2vec2-base-960h"
+
+
+def ctc_forced_align(
+    log_probs: np.ndarray, tokens: List[int], blank: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Viterbi alignment of a token sequence to the CTC log probabilities of shape (n_frames, vocabulary size).
+    Returns, for each frame, the index of the aligned token in tokens (-1 for blank frames) and its log probability.
+    """
+    n_frames = log_probs.shape[0]
+    # Tokens interleaved with blanks: blank, t_0, blank, t_1, ..., blank
+    states = np.full(2 * len(tokens) + 1, blank)
+    states[1::2] = tokens
+    n_states = len(states)
+    if n_frames < len(tokens):
+        raise ValueError("The audio is too short for the transcript")
+
+    # A token can be reached skipping the previous blank, if it is different from the previous token
+    can_skip = np.zeros(n_states, dtype=bool)
+    can_skip[3::2] = states[3::2] != states[1:-2:2]
+
+    scores = np.full(n_states, -np.inf)
+    scores[:2] = log_probs[0, states[:2]]
+    # Previous state of the best path, for each frame and state (0: same, 1: previous, 2: skip)
+    backpointers = np.zeros((n_frames, n_states), dtype=np.int8)
+    for t in range(1, n_frames):
+        stay = scores
+        advance = np.concatenate([[-np.inf], scores[:-1]])
+        skip = np.where(
+            can_skip, np.concatenate([[-np.inf, -np.inf], scores[:-2]]), -np.inf
+        )
+        candidates = np.stack([stay, advance, skip])
+        backpointers[t] = candidates.argmax(0)
+        scores = candidates.max(0) + log_probs[t, states]
+
+    # The path ends in the last token or in the final blank
+    state = n_states - 1 if scores[-1] >= scores[-2] else n_states - 2
+    if not np.isfinite(scores[state]):
+        raise ValueError("The transcript cannot be aligned to the audio")
+
+    frame_tokens = np.empty(n_frames, dtype=int)
+    frame_log_probs = np.empty(n_frames)
+    for t in range(n_frames - 1, -1, -1):
+        frame_tokens[t] = state // 2 if state % 2 == 1 else -1
+        frame_log_probs[t] = log_probs[t, states[state]]
+        state -= backpointers[t, state]
+    return frame_tokens, frame_log_probs
+
+
+class CTCWordSegmenter:
+    """
+    Word segmentation of an audio with a known transcript (e.g., the transcriptions of FSC),
+    by forced alignment with a CTC model (Wav2Vec2ForCTC). A lightweight alternative to whisperx on CPU.
+    """
+
+    def __init__(self, model_name_or_path: str = DEFAULT_CTC_MODEL, device="cpu"):
+        """
+        Args:
+            model_name_or_path: name or local path of the Wav2Vec2ForCTC checkpoint, with a character vocabulary
+            device: device of the model
+        """
+        from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
+
+        self.processor = Wav2Vec2Processor.from_pretrained(model_name_or_path)
+        self.model = Wav2Vec2ForCTC.from_pretrained(model_name_or_path).to(device)
+        self.model.eval()
+        self.device = device
+        self.sampling_rate = self.processor.feature_extractor.sampling_rate
+
+        tokenizer = self.processor.tokenizer
+        self.vocabulary = tokenizer.get_vocab()
+        self.blank = tokenizer.pad_token_id
+        self.word_delimiter = self.vocabulary.get(tokenizer.word_delimiter_token)
+        # E.g., the vocabulary of wav2vec2-base-960h is uppercase
+        self.uppercase = all(
+            not token.isalpha() or token.isupper()
+            for token in self.vocabulary
+            if len(token) == 1
+        )
+
+    def _word_tokens(self, word: str) -> List[int]:
+        word = word.upper() if self.uppercase else word.lower()
+        # Characters not in the vocabulary (e.g., punctuation) are not aligned
+        return [self.vocabulary[char] for char in word if char in self.vocabulary]
+
+    def _load_audio(self, audio_path: str) -> np.ndarray:
+        audio = load_audio(audio_path).segment
+        audio = audio.set_channels(1).set_frame_rate(self.sampling_rate)
+        return pydub_to_np(audio)[0].squeeze(-1)
+
+    def align(
+        self, audio: Union[str, np.ndarray], transcript: str
+    ) -> List[Dict[str, Union[str, float]]]:
+        """
+        Words of the transcript with their start and end times (in seconds), as utils_removal.transcribe_audio.
+        Words without any character of the vocabulary of the model are not returned.
+
+        Args:
+            audio: audio path, or the audio as a numpy array at the sampling rate of the model
+            transcript: text of the audio
+        """
+        if isinstance(audio, str):
+            audio = self._load_audio(audio)
+        audio = np.asarray(audio, dtype=np.float32).squeeze()
+
+        inputs = self.processor(
+            audio, sampling_rate=self.sampling_rate, return_tensors="pt"
+        )
+        with torch.no_grad():
+            logits = self.model(inputs.input_values.to(self.device)).logits[0]
+        log_probs = torch.log_softmax(logits.float(), dim=-1).cpu().numpy()
+
+        # Token sequence of the transcript, with the word delimiter between words
+        words, tokens, token_words = [], [], []
+        for word in transcript.split():
+            word_tokens = self._word_tokens(word)
+            if len(word_tokens) == 0:
+                continue
+            if tokens and self.word_delimiter is not None:
+                tokens.append(self.word_delimiter)
+                token_words.append(-1)
+            tokens.extend(word_tokens)
+            token_words.extend([len(words)] * len(word_tokens))
+            words.append(word)
+        if len(words) == 0:
+            return []
+
+        frame_tokens, frame_log_probs = ctc_forced_align(log_probs, tokens, self.blank)
+
+        # Seconds per frame of the CTC output
+        frame_duration = len(audio) / self.sampling_rate / log_probs.shape[0]
+        frame_words = np.where(
+            frame_tokens >= 0, np.array(token_words)[frame_tokens], -1
+        )
+        segments = []
+        for word_idx, word in enumerate(words):
+            frames = np.flatnonzero(frame_words == word_idx)
+            segments.append(
+                {
+                    "word": word,
+                    "start": round(float(frames[0] * frame_duration), 3),
+                    "end": round(float((frames[-1] + 1) * frame_duration), 3),
+                    "score": round(float(np.exp(frame_log_probs[frames]).mean()), 3),
+                }
+            )
+        return segments
+
+
+class CTCAlignmentProvider(AlignmentProvider):
+    """
+    Alignment provider of the audios with a known transcript, by CTC forced alignment (see CTCWordSegmenter).
+    The transcripts are looked up by audio path and then by key (by default, the file name without extension).
+    """
+
+    def __init__(
+        self,
+        transcripts: Dict[str, str],
+        segmenter: CTCWordSegmenter = None,
+        key_function: Callable[[str], str] = get_audio_key,
+    ):
+        """
+        Args:
+            transcripts: transcript of each audio path (or key). See load_fsc_transcripts
+            segmenter: CTC word segmenter. If None, CTCWordSegmenter with the default model on CPU
+        """
+        self.transcripts = transcripts
+        self.segmenter = segmenter if segmenter is not None else CTCWordSegmenter()
+        self.key_function = key_function
+
+    def get_transcript(
+        self, audio_path: str, language: str = None, device: str = None
+    ) -> Optional[Tuple[str, Words]]:
+        for key in (
+            audio_path,
+            os.path.abspath(audio_path),
+            self.key_function(audio_path),
+        ):
+            if key in self.transcripts:
+                text = self.transcripts[key]
+                return text, self.segmenter.align(audio_path, text)
+        return None
+
+
+def load_fsc_transcripts(data_dir: str, split: str = "test") -> Dict[str, str]:
+    """
+    Transcripts of the Fluent Speech Commands audios, by audio path (as in utils.load_dataset_and_model)
+    """
+    import pandas as pd
+
+    df = pd.read_csv(os.path.join(data_dir, "data", f"{split}_data.csv"))
+    return {
+        os.path.join(data_dir, path): transcription
+        for path, transcription in zip(df["path"], df["transcription"])
+    }
@@ -1,14 +1,11 @@
 from speechxai.explainers.explanation_speech import ExplanationSpeech
-from speechxai.utils import pydub_to_np
-from typing import List
-from pydub import AudioSegment
-from captum.attr import Saliency, InputXGradient
+from typing import List, Union
 import numpy as np
 import torch
 
-
 # TODO - include in utils
 from speechxai.explainers.loo_speech_explainer import transcribe_audio
+from speechxai.audio_io import LoadedAudio, load_audio
 
 
 class GradientEqualWidthSpeechExplainer:
@@ -42,6 +39,8 @@ class GradientEqualWidthSpeechExplainer:
         else:
             func = self.model_helper.get_logits_from_input_embeds
 
+        from captum.attr import Saliency, InputXGradient
+
         dl = InputXGradient(func) if self.multiply_by_inputs else Saliency(func)
 
         inputs = self.model_helper.feature_extractor(
@@ -60,7 +59,7 @@ class GradientEqualWidthSpeechExplainer:
 
     def compute_explanation(
         self,
-        audio_path: str,
+        audio_path: Union[str, LoadedAudio],
         target_class=None,
         aggregation: str = "mean",
         num_s_split: float = 0.25,
@@ -81,8 +80,8 @@ class GradientEqualWidthSpeechExplainer:
             )
 
         # Load audio and convert to np.array
-        audio_as = AudioSegment.from_wav(audio_path)
-        audio = pydub_to_np(audio_as)[0]
+        loaded_audio = load_audio(audio_path)
+        audio = loaded_audio.samples
 
         # Predict logits/probabilities
         logits_original = self.model_helper.predict([audio])
@@ -162,7 +161,7 @@ class GradientEqualWidthSpeechExplainer:
             scores=scores,
             explainer=self.NAME + "-" + aggregation,
             target=targets if n_labels > 1 else targets,
-            audio_path=audio_path,
+            audio_path=loaded_audio.path,
         )
 
         return explanation
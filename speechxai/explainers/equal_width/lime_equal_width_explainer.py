@@ -1,11 +1,9 @@
 from speechxai.explainers.explanation_speech import ExplanationSpeech
-from speechxai.utils import pydub_to_np
-from typing import List
-from pydub import AudioSegment
+from typing import List, Union
 import numpy as np
-from speechxai.explainers.lime_timeseries import LimeTimeSeriesExplainer
 
 from speechxai.explainers.utils_removal import transcribe_audio
+from speechxai.audio_io import LoadedAudio, load_audio
 
 EMPTY_SPAN = "---"
 
@@ -18,7 +16,7 @@ class LIMEEqualWidthSpeechExplainer:
 
     def compute_explanation(
         self,
-        audio_path: str,
+        audio_path: Union[str, LoadedAudio],
         target_class=None,
         removal_type: str = "silence",
         num_samples: int = 1000,
@@ -37,8 +35,8 @@ class LIMEEqualWidthSpeechExplainer:
             )
 
         # Load audio and convert to np.array
-        audio_as = AudioSegment.from_wav(audio_path)
-        audio = pydub_to_np(audio_as)[0]
+        loaded_audio = load_audio(audio_path)
+        audio = loaded_audio.samples
 
         # Predict logits/probabilities
         logits_original = self.model_helper.predict([audio])
@@ -78,6 +76,8 @@ class LIMEEqualWidthSpeechExplainer:
             )
             splits.append({"start": start, "end": end, "word": e})
 
+        from speechxai.explainers.lime_timeseries import LimeTimeSeriesExplainer
+
         lime_explainer = LimeTimeSeriesExplainer()
 
         # Compute gradient importance for each target label
@@ -137,7 +137,7 @@ class LIMEEqualWidthSpeechExplainer:
             scores=scores,
             explainer=self.NAME + "+" + removal_type,
             target=targets if n_labels > 1 else targets,
-            audio_path=audio_path,
+            audio_path=loaded_audio.path,
         )
 
         return explanation
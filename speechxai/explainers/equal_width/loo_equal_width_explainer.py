@@ -1,50 +1,36 @@
 """LOO Speech Explainer module"""
 import numpy as np
 from typing import Dict, List, Union, Tuple
-import whisperx
-from pydub import AudioSegment
-from speechxai.utils import pydub_to_np, print_log
-from IPython.display import display
+from speechxai.utils import print_log
 from speechxai.explainers.explanation_speech import ExplanationSpeech
-import os
+from speechxai.audio_io import LoadedAudio, load_audio
+from speechxai.explainers.utils_removal import get_word_spans, remove_spans
 
 
-def remove_audio_segment(audio, start_s, end_s, removal_type: str = "silence"):
+def remove_audio_segment(
+    audio: np.ndarray,
+    start_s: float,
+    end_s: float,
+    removal_type: str = "silence",
+    sampling_rate: int = 16000,
+) -> np.ndarray:
     """
-    Remove an audio segment from audio using pydub, by replacing it with:
+    Remove an audio segment from the waveform (see utils_removal.remove_spans), by replacing it with:
     - nothing
     - silence
     - white noise
     - pink noise
 
     Args:
-        audio (pydub.AudioSegment): audio
-        word: word to remove with its start and end times
-        removal_type (str, optional): type of removal. Defaults to "nothing".
+        audio (np.ndarray): waveform of shape [n_samples, channels]
+        start_s, end_s: start and end of the segment in seconds
+        removal_type (str, optional): type of removal. Defaults to "silence".
+        sampling_rate: sampling rate of the audio
     """
-
-    start_idx = int(start_s * 1000)
-    end_idx = int(end_s * 1000)
-    before_word_audio = audio[:start_idx]
-    after_word_audio = audio[end_idx:]
-    word_duration = end_idx - start_idx
-
-    if removal_type == "nothing":
-        replace_word_audio = AudioSegment.empty()
-    elif removal_type == "silence":
-        replace_word_audio = AudioSegment.silent(duration=word_duration)
-
-    elif removal_type == "white noise":
-        sound_path = (os.path.join(os.path.dirname(__file__), "white_noise.mp3"),)
-        replace_word_audio = AudioSegment.from_mp3(sound_path)[:word_duration]
-
-        # display(audio_removed)
-    elif removal_type == "pink noise":
-        sounds_path = (os.path.join(os.path.dirname(__file__), "pink_noise.mp3"),)
-        replace_word_audio = AudioSegment.from_mp3(sound_path)[:word_duration]
-
-    audio_removed = before_word_audio + replace_word_audio + after_word_audio
-    return audio_removed
+    spans = get_word_spans(
+        [{"start": start_s, "end": end_s}], sampling_rate, len(audio), padding=(0, 0)
+    )
+    return remove_spans(audio, spans, removal_type, sampling_rate)
 
 
 class LOOSpeechEqualWidthExplainer:
@@ -55,7 +41,7 @@ class LOOSpeechEqualWidthExplainer:
 
     def compute_explanation(
         self,
-        audio_path: str,
+        audio_path: Union[str, LoadedAudio],
         target_class=None,
         removal_type: str = "silence",
         num_s_split: float = 0.25,
@@ -65,25 +51,29 @@ class LOOSpeechEqualWidthExplainer:
         Computes the importance of each equal width audio segment in the audio.
         """
 
-        ## Load audio as pydub.AudioSegment
-        audio = AudioSegment.from_wav(audio_path)
-        audio_np = pydub_to_np(audio)[0]
+        ## Load audio (decoded once, see audio_io.load_audio)
+        loaded_audio = load_audio(audio_path)
+        audio_np = loaded_audio.samples
 
         ## Remove word
         audio_remove_segments = []
 
-        duration_s = len(audio) / 1000
+        duration_s = loaded_audio.duration
 
         for i in np.arange(0, duration_s, num_s_split):
             start_s = i
             end_s = min(i + num_s_split, duration_s)
-            audio_removed = remove_audio_segment(audio, start_s, end_s, removal_type)
+            audio_removed = remove_audio_segment(
+                audio_np, start_s, end_s, removal_type, loaded_audio.frame_rate
+            )
 
-            audio_remove_segments.append(pydub_to_np(audio_removed)[0])
+            audio_remove_segments.append(audio_removed)
 
             if display_audio:
                 print_log(int(start_s / num_s_split), start_s, end_s)
-                display(audio_removed)
+                from IPython.display import Audio, display
+
+                display(Audio(audio_removed.squeeze(), rate=loaded_audio.frame_rate))
 
         # Get original logits
         logits_original = self.model_helper.predict([audio_np])
@@ -137,7 +127,7 @@ class LOOSpeechEqualWidthExplainer:
             scores=scores,
             explainer=self.NAME + "+" + removal_type,
             target=targets if n_labels > 1 else [targets],
-            audio_path=audio_path,
+            audio_path=loaded_audio.path,
         )
 
         return explanation
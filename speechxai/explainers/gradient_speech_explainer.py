@@ -1,14 +1,11 @@
 from speechxai.explainers.explanation_speech import ExplanationSpeech
-from speechxai.utils import pydub_to_np
-from typing import List
-from pydub import AudioSegment
-from captum.attr import Saliency, InputXGradient
+from typing import List, Union
 import numpy as np
 import torch
 
-
 # TODO - include in utils
-from speechxai.explainers.loo_speech_explainer import transcribe_audio
+from speechxai.explainers.alignment_providers import get_word_alignment
+from speechxai.audio_io import LoadedAudio, load_audio
 
 
 class GradientSpeechExplainer:
@@ -42,6 +39,8 @@ class GradientSpeechExplainer:
         else:
             func = self.model_helper.get_logits_from_input_embeds
 
+        from captum.attr import Saliency, InputXGradient
+
         dl = InputXGradient(func) if self.multiply_by_inputs else Saliency(func)
 
         inputs = self.model_helper.feature_extractor(
@@ -60,7 +59,7 @@ class GradientSpeechExplainer:
 
     def compute_explanation(
         self,
-        audio_path: str,
+        audio_path: Union[str, LoadedAudio],
         target_class=None,
         words_trascript: List = None,
         no_before_span: bool = True,
@@ -69,7 +68,7 @@ class GradientSpeechExplainer:
         """
         Compute the word-level explanation for the given audio.
         Args:
-        audio_path: path to the audio file
+        audio_path: path to the audio file (or the audio loaded with audio_io.load_audio)
         target_class: target class - int - If None, use the predicted class
         no_before_span: if True, it also consider the span before the word. This is because we observe gradient give importance also for the frame just before the word
         aggregation: aggregation method for the frames of the word. Can be "mean" or "max"
@@ -81,7 +80,8 @@ class GradientSpeechExplainer:
             )
 
         # Load audio and convert to np.array
-        audio = pydub_to_np(AudioSegment.from_wav(audio_path))[0]
+        loaded_audio = load_audio(audio_path)
+        audio = loaded_audio.samples
 
         # Predict logits/probabilities
         logits_original = self.model_helper.predict([audio])
@@ -105,8 +105,8 @@ class GradientSpeechExplainer:
 
         if words_trascript is None:
             # Transcribe audio
-            _, words_trascript = transcribe_audio(
-                audio_path=audio_path, language=self.model_helper.language
+            _, words_trascript = get_word_alignment(
+                audio_path=loaded_audio.path, language=self.model_helper.language
             )
 
         # Compute gradient importance for each target label
@@ -183,7 +183,7 @@ class GradientSpeechExplainer:
             scores=scores,
             explainer=self.NAME + "-" + aggregation,
             target=targets if n_labels > 1 else targets,
-            audio_path=audio_path,
+            audio_path=loaded_audio.path,
         )
 
         return explanation
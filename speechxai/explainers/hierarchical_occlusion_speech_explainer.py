@@ -0,0 +1,142 @@
+"""Hierarchical occlusion: LOO on groups of words, refined only where the groups matter"""
+import numpy as np
+from typing import List, Tuple, Union
+from speechxai.explainers.explanation_speech import ExplanationSpeech
+from speechxai.explainers.loo_speech_explainer import LOOSpeechExplainer
+from speechxai.explainers.perturbations import (
+    SpanPerturbation,
+    predict_perturbed_audios,
+)
+from speechxai.audio_io import LoadedAudio, load_audio
+from speechxai.model_helpers.utils_inference import incremental_reference
+
+
+class HierarchicalOcclusionSpeechExplainer(LOOSpeechExplainer):
+    """
+    Occludes groups of contiguous words (of at most group_size words) and splits in halves, recursively, only the groups
+    whose removal changes the probability of the target class by at least threshold (for any label, as for FSC).
+    The groups at each level are predicted together, in batches.
+
+    The words of a group that is not split share its score equally. The words occluded alone get the LOO score.
+    With threshold=0, all the groups are split down to single words: the scores are the LOO scores.
+
+    It saves model evaluations over LOO (one per word) only on long utterances where few words matter: splitting a group
+    down to single words costs more evaluations than occluding its words one at a time. So the words are occluded one at a time,
+    as LOO, if the audio has at most group_size words, if threshold <= 0, or if all the groups of the first level are split.
+    """
+
+    NAME = "hierarchical_loo_speech"
+
+    def __init__(self, model_helper, threshold: float = 0.05, group_size: int = 8):
+        """
+        Args:
+            model_helper: model helper
+            threshold: minimum absolute change of the probability of the target class to split a group
+            group_size: number of words of the groups of the first level
+        """
+        if group_size < 1:
+            raise ValueError("group_size must be at least 1")
+        super().__init__(model_helper)
+        self.threshold = threshold
+        self.group_size = group_size
+        # Number of model evaluations of the last explanation (original audio included)
+        self.n_evaluations = 0
+
+    def _get_target_probs(self, logits, targets) -> np.ndarray:
+        """
+        Probability of the target class of each audio, of shape [n_audios, n_labels]
+        """
+        if self.model_helper.n_labels > 1:
+            # Multilabel scenario as for FSC
+            return np.stack(
+                [logits[i][:, target] for i, target in enumerate(targets)], axis=1
+            )
+        return logits[:, [targets]]
+
+    def compute_explanation(
+        self,
+        audio_path: Union[str, LoadedAudio],
+        target_class=None,
+        removal_type: str = "silence",
+        words_trascript: List = None,
+    ) -> ExplanationSpeech:
+        """
+        Computes the importance of each word in the audio, by hierarchical occlusion of the words.
+        The number of model evaluations is stored in self.n_evaluations.
+        """
+        loaded_audio = load_audio(audio_path)
+        words = self.get_words(loaded_audio, words_trascript)
+        n_words = len(words)
+        n_labels = self.model_helper.n_labels
+
+        logits_original = self.model_helper.predict([loaded_audio.samples])
+        targets = self.get_targets(logits_original, target_class)
+        original_probs = self._get_target_probs(logits_original, targets)[0]
+        n_evaluations = 1
+
+        scores = np.zeros((n_labels, n_words))
+        # Groups of words [start, end) of the current level
+        if n_words <= self.group_size or self.threshold <= 0:
+            # All the groups would be split: the words are occluded one at a time, as LOO
+            groups = [(start, start + 1) for start in range(n_words)]
+        else:
+            groups = [
+                (start, min(start + self.group_size, n_words))
+                for start in range(0, n_words, self.group_size)
+            ]
+        first_level = True
+        # With incremental encoding, only the frames of the removed words are recomputed (not for the removal type "nothing")
+        with incremental_reference(self.model_helper, loaded_audio.samples):
+            while groups:
+                perturbations = [
+                    SpanPerturbation.from_words(
+                        loaded_audio.samples,
+                        words[start:end],
+                        removal_type,
+                        loaded_audio.frame_rate,
+                    )
+                    for start, end in groups
+                ]
+                logits_modified = predict_perturbed_audios(
+                    self.model_helper, perturbations
+                )
+                n_evaluations += len(groups)
+                prediction_diffs = original_probs - self._get_target_probs(
+                    logits_modified, targets
+                )
+
+                split_groups = []
+                for (start, end), prediction_diff in zip(groups, prediction_diffs):
+                    if (
+                        end - start > 1
+                        and np.abs(prediction_diff).max() >= self.threshold
+                    ):
+                        split_groups.append((start, end))
+                    else:
+                        # The words of the group share its score
+                        group_score = prediction_diff / (end - start)
+                        scores[:, start:end] = group_score[:, None]
+
+                if first_level and len(split_groups) == len(groups):
+                    # All the groups matter: the words are occluded one at a time, as LOO
+                    groups = [
+                        (word, word + 1)
+                        for start, end in split_groups
+                        for word in range(start, end)
+                    ]
+                else:
+                    groups = []
+                    for start, end in split_groups:
+                        middle = (start + end) // 2
+                        groups.extend([(start, middle), (middle, end)])
+                first_level = False
+
+        self.n_evaluations = n_evaluations
+
+        return ExplanationSpeech(
+            features=[word["word"] for word in words],
+            scores=scores,
+            explainer=self.NAME + "+" + removal_type,
+            target=targets if n_labels > 1 else [targets],
+            audio_path=loaded_audio.path,
+        )
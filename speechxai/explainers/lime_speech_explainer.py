@@ -1,11 +1,13 @@
 from speechxai.explainers.explanation_speech import ExplanationSpeech
-from speechxai.utils import pydub_to_np
-from typing import List
-from pydub import AudioSegment
+from typing import List, Union
 import numpy as np
-from speechxai.explainers.lime_timeseries import LimeTimeSeriesExplainer
 
-from speechxai.explainers.utils_removal import transcribe_audio
+from speechxai.explainers.alignment_providers import get_word_alignment
+from speechxai.audio_io import LoadedAudio, load_audio
+from speechxai.model_helpers.utils_inference import (
+    MAX_BATCH_SAMPLES,
+    incremental_reference,
+)
 
 EMPTY_SPAN = "---"
 
@@ -18,7 +20,7 @@ class LIMESpeechExplainer:
 
     def compute_explanation(
         self,
-        audio_path: str,
+        audio_path: Union[str, LoadedAudio],
         target_class=None,
         words_trascript: List = None,
         removal_type: str = "silence",
@@ -27,7 +29,7 @@ class LIMESpeechExplainer:
         """
         Compute the word-level explanation for the given audio.
         Args:
-        audio_path: path to the audio file
+        audio_path: path to the audio file (or the audio loaded with audio_io.load_audio)
         target_class: target class - int - If None, use the predicted class
         removal_type:
         """
@@ -38,7 +40,8 @@ class LIMESpeechExplainer:
             )
 
         # Load audio and convert to np.array
-        audio = pydub_to_np(AudioSegment.from_wav(audio_path))[0]
+        loaded_audio = load_audio(audio_path)
+        audio = loaded_audio.samples
 
         # Predict logits/probabilities
         logits_original = self.model_helper.predict([audio])
@@ -62,8 +65,8 @@ class LIMESpeechExplainer:
 
         if words_trascript is None:
             # Transcribe audio
-            _, words_trascript = transcribe_audio(
-                audio_path=audio_path, language=self.model_helper.language
+            _, words_trascript = get_word_alignment(
+                audio_path=loaded_audio.path, language=self.model_helper.language
             )
         audio_np = audio.reshape(1, -1)
 
@@ -82,36 +85,57 @@ class LIMESpeechExplainer:
             old_start = end
         splits.append({"start": old_start, "end": tot_len, "word": EMPTY_SPAN})
 
+        from speechxai.explainers.lime_timeseries import LimeTimeSeriesExplainer
+
         lime_explainer = LimeTimeSeriesExplainer()
 
-        # Compute gradient importance for each target label
-        # This also handles the multilabel scenario as for FSC
-        scores = []
-        for target_label, target_class in enumerate(targets):
-            if self.model_helper.n_labels > 1:
-                # We get the prediction probability for the given label
-                predict_proba_function = (
-                    self.model_helper.get_prediction_function_by_label(target_label)
-                )
-            else:
-                predict_proba_function = self.model_helper.predict
-            from copy import deepcopy
+        # The perturbed audios are materialized one batch at a time, within the batch budget of the model helper
+        batch_size = max(
+            1,
+            getattr(self.model_helper, "max_batch_samples", MAX_BATCH_SAMPLES)
+            // audio_np.size,
+        )
 
-            input_audio = deepcopy(audio_np)
+        if n_labels > 1:
+            # Multilabel scenario as for FSC: the probabilities of all the labels side by side,
+            # so that a single neighborhood is scored once and a surrogate model is fitted for each label on it
+            label_offsets = np.cumsum(
+                [0] + [logits_label.shape[1] for logits_label in logits_original[:-1]]
+            )
+
+            def predict_proba_function(audios):
+                return np.concatenate(self.model_helper.predict(audios), axis=1)
 
-            # Explain the instance using the splits as interpretable features
+        else:
+            label_offsets = [0]
+            predict_proba_function = self.model_helper.predict
+
+        # Column of the target class of each label in the probabilities of predict_proba_function
+        lime_labels = [
+            int(offset + target_class)
+            for offset, target_class in zip(label_offsets, targets)
+        ]
+
+        # Explain the instance using the splits as interpretable features
+        # With incremental encoding, only the frames of the perturbed splits are recomputed
+        with incremental_reference(self.model_helper, audio):
             exp = lime_explainer.explain_instance(
-                input_audio,
+                audio_np,
                 predict_proba_function,
                 num_features=len(splits),
                 num_samples=num_samples,
                 num_slices=len(splits),
                 replacement_method=removal_type,
                 splits=splits,
-                labels=(target_class,),
+                labels=lime_labels,
+                batch_size=batch_size,
             )
 
-            map_scores = {k: v for k, v in exp.as_map()[target_class]}
+        # Importance of the words for each target label
+        # This also handles the multilabel scenario as for FSC
+        scores = []
+        for lime_label in lime_labels:
+            map_scores = {k: v for k, v in exp.as_map()[lime_label]}
             map_scores = {
                 k: v
                 for k, v in sorted(
@@ -144,7 +168,7 @@ class LIMESpeechExplainer:
             scores=scores,
             explainer=self.NAME + "+" + removal_type,
             target=targets if n_labels > 1 else targets,
-            audio_path=audio_path,
+            audio_path=loaded_audio.path,
         )
 
         return explanation
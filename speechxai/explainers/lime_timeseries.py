@@ -12,7 +12,9 @@ import sklearn
 from lime import explanation
 from lime import lime_base
 import math
-import logging
+
+# Number of perturbed time series materialized at once (see predict_neighborhood). # MODIFIED
+NEIGHBORHOOD_BATCH_SIZE = 64
 
 
 class TSDomainMapper(explanation.DomainMapper):
@@ -86,6 +88,7 @@ class LimeTimeSeriesExplainer(object):
         model_regressor=None,
         replacement_method="mean",
         splits=None,  # list of dicts with start, end and word. # MODIFIED
+        batch_size=NEIGHBORHOOD_BATCH_SIZE,  # MODIFIED
     ):
         """Generates explanations for a prediction.
 
@@ -117,6 +120,8 @@ class LimeTimeSeriesExplainer(object):
                 model_regressor.coef_ and 'sample_weight' as a parameter to
                 model_regressor.fit()
             splits: list of dicts with start, end and word. # MODIFIED
+            batch_size: number of perturbed time series materialized and
+                passed to classifier_fn at once. # MODIFIED
         Returns:
             An Explanation object (see explanation.py) with the corresponding
             explanations.
@@ -136,6 +141,7 @@ class LimeTimeSeriesExplainer(object):
                 num_slices,
                 splits,
                 replacement_method,
+                batch_size,
             )
         else:
             print(
@@ -147,6 +153,7 @@ class LimeTimeSeriesExplainer(object):
                 num_samples,
                 num_slices,
                 replacement_method,
+                batch_size,
             )
 
         is_multivariate = len(timeseries_instance.shape) > 1
@@ -189,6 +196,7 @@ class LimeTimeSeriesExplainer(object):
         num_samples,
         num_slices,
         replacement_method="mean",
+        batch_size=NEIGHBORHOOD_BATCH_SIZE,
     ):
         """Generates a neighborhood around a prediction.
 
@@ -210,6 +218,8 @@ class LimeTimeSeriesExplainer(object):
                 for discretization.
             replacement_method:  Defines how individual slice will be
                 deactivated (can be 'mean', 'total_mean', 'noise')
+            batch_size: number of perturbed time series materialized at once
+                (see predict_neighborhood)
         Returns:
             A tuple (data, labels, distances), where:
                 data: dense num_samples * K binary matrix, where K is the
@@ -235,52 +245,23 @@ class LimeTimeSeriesExplainer(object):
             num_channels, len_ts = timeseries.shape
 
         values_per_slice = math.ceil(len_ts / num_slices)
-        deact_per_sample = np.random.randint(1, num_slices + 1, num_samples - 1)
-        perturbation_matrix = np.ones((num_samples, num_channels, num_slices))
-        features_range = range(num_slices)
-        original_data = [timeseries.copy()]
-
-        for i, num_inactive in enumerate(deact_per_sample, start=1):
-            logging.info("sample %d, inactivating %d", i, num_inactive)
-            # choose random slices indexes to deactivate
-            inactive_idxs = np.random.choice(
-                features_range, num_inactive, replace=False
-            )
-            num_channels_to_perturb = np.random.randint(1, num_channels + 1)
-
-            channels_to_perturb = np.random.choice(
-                range(num_channels), num_channels_to_perturb, replace=False
-            )
-
-            logging.info("sample %d, perturbing signals %r", i, channels_to_perturb)
-
-            for chan in channels_to_perturb:
-                perturbation_matrix[i, chan, inactive_idxs] = 0
-
-            tmp_series = timeseries.copy()
-
-            for idx in inactive_idxs:
-                start_idx = idx * values_per_slice
-                end_idx = start_idx + values_per_slice
-                end_idx = min(end_idx, len_ts)
-
-                if replacement_method == "mean":
-                    # use mean of slice as inactive
-                    perturb_mean(tmp_series, start_idx, end_idx, channels_to_perturb)
-                elif replacement_method == "noise":
-                    # use random noise as inactive
-                    perturb_noise(tmp_series, start_idx, end_idx, channels_to_perturb)
-                elif replacement_method == "total_mean":
-                    # use total series mean as inactive
-                    perturb_total_mean(
-                        tmp_series, start_idx, end_idx, channels_to_perturb
-                    )
-                elif replacement_method == "silence":
-                    # NEW - MODIFIED - We also include the silence as a possible replacement
-                    perturb_zeroing(tmp_series, start_idx, end_idx, channels_to_perturb)
-            original_data.append(tmp_series)
+        # MODIFIED - The masks are drawn in one vectorized call
+        perturbation_matrix = sample_perturbation_matrix(
+            num_samples, num_channels, num_slices
+        )
 
-        predictions = classifier_fn(np.array(original_data))
+        slice_bounds = [
+            (idx * values_per_slice, min((idx + 1) * values_per_slice, len_ts))
+            for idx in range(num_slices)
+        ]
+        predictions = predict_neighborhood(
+            timeseries,
+            classifier_fn,
+            perturbation_matrix,
+            get_slice_index(slice_bounds, len_ts),
+            replacement_method,
+            batch_size,
+        )
 
         # create a flat representation for features
         perturbation_matrix = perturbation_matrix.reshape(
@@ -298,6 +279,7 @@ class LimeTimeSeriesExplainer(object):
         num_slices,
         splits,
         replacement_method="mean",
+        batch_size=NEIGHBORHOOD_BATCH_SIZE,
     ):
         """Generates a neighborhood around a prediction.
 
@@ -319,6 +301,8 @@ class LimeTimeSeriesExplainer(object):
                 for discretization.
             replacement_method:  Defines how individual slice will be
                 deactivated (can be 'mean', 'total_mean', 'noise')
+            batch_size: number of perturbed time series materialized at once
+                (see predict_neighborhood)
         Returns:
             A tuple (data, labels, distances), where:
                 data: dense num_samples * K binary matrix, where K is the
@@ -346,53 +330,21 @@ class LimeTimeSeriesExplainer(object):
         assert len(splits) == num_slices, "splits must be of length num_slices"
 
         # values_per_slice = math.ceil(len_ts / num_slices)
-        deact_per_sample = np.random.randint(1, num_slices + 1, num_samples - 1)
-        perturbation_matrix = np.ones((num_samples, num_channels, num_slices))
-        features_range = range(num_slices)
-        original_data = [timeseries.copy()]
-
-        for i, num_inactive in enumerate(deact_per_sample, start=1):
-            logging.info("sample %d, inactivating %d", i, num_inactive)
-            # choose random slices indexes to deactivate
-            inactive_idxs = np.random.choice(
-                features_range, num_inactive, replace=False
-            )
-            num_channels_to_perturb = np.random.randint(1, num_channels + 1)
-
-            channels_to_perturb = np.random.choice(
-                range(num_channels), num_channels_to_perturb, replace=False
-            )
+        # MODIFIED - The masks are drawn in one vectorized call
+        perturbation_matrix = sample_perturbation_matrix(
+            num_samples, num_channels, num_slices
+        )
 
-            logging.info("sample %d, perturbing signals %r", i, channels_to_perturb)
-
-            for chan in channels_to_perturb:
-                perturbation_matrix[i, chan, inactive_idxs] = 0
-
-            tmp_series = timeseries.copy()
-
-            for idx in inactive_idxs:
-                # Rather than equally sized slices, we use the word-level splits
-                start_idx = splits[idx]["start"]
-                end_idx = splits[idx]["end"]
-                end_idx = min(end_idx, len_ts)
-
-                if replacement_method == "mean":
-                    # use mean of slice as inactive
-                    perturb_mean(tmp_series, start_idx, end_idx, channels_to_perturb)
-                elif replacement_method == "noise":
-                    # use random noise as inactive
-                    perturb_noise(tmp_series, start_idx, end_idx, channels_to_perturb)
-                elif replacement_method == "total_mean":
-                    # use total series mean as inactive
-                    perturb_total_mean(
-                        tmp_series, start_idx, end_idx, channels_to_perturb
-                    )
-                elif replacement_method == "silence":
-                    # NEW - MODIFIED - We also include the silence as a possible replacement
-                    perturb_zeroing(tmp_series, start_idx, end_idx, channels_to_perturb)
-            original_data.append(tmp_series)
-
-        predictions = classifier_fn(np.array(original_data))
+        # Rather than equally sized slices, we use the word-level splits
+        slice_bounds = [(split["start"], min(split["end"], len_ts)) for split in splits]
+        predictions = predict_neighborhood(
+            timeseries,
+            classifier_fn,
+            perturbation_matrix,
+            get_slice_index(slice_bounds, len_ts),
+            replacement_method,
+            batch_size,
+        )
 
         # create a flat representation for features
         perturbation_matrix = perturbation_matrix.reshape(
@@ -403,6 +355,152 @@ class LimeTimeSeriesExplainer(object):
         return perturbation_matrix, predictions, distances
 
 
+def _random_subsets(num_rows, num_items, subset_sizes):
+    """Boolean matrix (num_rows, num_items): each row selects a uniformly
+    random subset of subset_sizes[row] items. # MODIFIED
+
+    The items with the subset_sizes[row] lowest random keys are selected.
+    """
+    ranks = np.argsort(np.argsort(np.random.rand(num_rows, num_items), axis=1), axis=1)
+    return ranks < subset_sizes[:, None]
+
+
+def sample_perturbation_matrix(num_samples, num_channels, num_slices):
+    """Binary masks of the neighborhood, of shape
+    (num_samples, num_channels, num_slices), drawn in one vectorized call. # MODIFIED
+
+    As in the original sampling, each perturbed sample deactivates a random
+    number (1 to num_slices) of random slices, in a random non-empty subset
+    of the channels. The first row is the original instance (all ones).
+    """
+    num_perturbed = num_samples - 1
+    deact_per_sample = np.random.randint(1, num_slices + 1, num_perturbed)
+    inactive_slices = _random_subsets(num_perturbed, num_slices, deact_per_sample)
+    channels_per_sample = np.random.randint(1, num_channels + 1, num_perturbed)
+    perturbed_channels = _random_subsets(
+        num_perturbed, num_channels, channels_per_sample
+    )
+
+    perturbation_matrix = np.ones((num_samples, num_channels, num_slices))
+    perturbation_matrix[1:][
+        perturbed_channels[:, :, None] & inactive_slices[:, None, :]
+    ] = 0
+    return perturbation_matrix
+
+
+def get_slice_index(slice_bounds, len_ts):
+    """Slice of each point of the time series. # MODIFIED
+
+    The points outside the slices get the index len(slice_bounds).
+    If the slices overlap, a point belongs to the last one.
+    """
+    slice_index = np.full(len_ts, len(slice_bounds))
+    for idx, (start_idx, end_idx) in enumerate(slice_bounds):
+        slice_index[start_idx:end_idx] = idx
+    return slice_index
+
+
+def predict_neighborhood(
+    timeseries,
+    classifier_fn,
+    perturbation_matrix,
+    slice_index,
+    replacement_method="mean",
+    batch_size=NEIGHBORHOOD_BATCH_SIZE,
+):
+    """Predictions of the neighborhood: the time series perturbed by
+    each mask of perturbation_matrix (the first one is the original). # MODIFIED
+
+    The samples are materialized batch_size at a time, in a buffer reused
+    across the batches, by broadcasting the masks of the batch over the runs
+    of points of each slice (see get_slice_index), and passed to classifier_fn.
+    In this way, the memory depends on batch_size and not on the number of
+    samples.
+
+    Args:
+        timeseries: time series to be explained
+        classifier_fn: classifier prediction probability function
+        perturbation_matrix: masks of shape (num_samples, num_channels, num_slices),
+            0 for the deactivated slices (see sample_perturbation_matrix)
+        slice_index: slice of each point of the time series (see get_slice_index)
+        replacement_method: how a slice is deactivated: 'mean' (mean of the slice),
+            'total_mean' (mean of the series), 'noise' (uniform random noise) or
+            'silence' (zeros)
+        batch_size: number of time series materialized at once
+    """
+    num_samples, num_channels, num_slices = perturbation_matrix.shape
+    series = timeseries.reshape(num_channels, -1)
+    active = perturbation_matrix != 0
+
+    # Runs of consecutive points of the same slice: each run is perturbed in
+    # all the samples of a batch at once
+    run_starts = np.flatnonzero(np.diff(slice_index)) + 1
+    run_starts = np.concatenate([[0], run_starts])
+    run_ends = np.concatenate([run_starts[1:], [len(slice_index)]])
+    runs = [
+        (start_idx, end_idx, slice_index[start_idx])
+        for start_idx, end_idx in zip(run_starts, run_ends)
+        # The points outside the slices are never deactivated
+        if slice_index[start_idx] < num_slices
+    ]
+
+    if replacement_method == "mean":
+        # Mean of each slice
+        counts = np.bincount(slice_index, minlength=num_slices + 1)
+        slice_means = np.stack(
+            [
+                np.bincount(slice_index, weights=channel, minlength=num_slices + 1)
+                for channel in series
+            ]
+        ) / np.maximum(counts, 1)
+    elif replacement_method == "total_mean":
+        total_means = series.mean(axis=1, keepdims=True)
+    elif replacement_method == "noise":
+        noise_low = series.min(axis=1, keepdims=True)
+        noise_high = series.max(axis=1, keepdims=True)
+    elif replacement_method != "silence":
+        # Unknown replacement method: the slices are not modified
+        runs = []
+
+    buffer = np.empty(
+        (min(batch_size, num_samples),) + series.shape, dtype=timeseries.dtype
+    )
+    # Channel of each row of a batch, with the samples and channels flattened
+    row_channels = np.tile(np.arange(num_channels), len(buffer))
+    predictions = []
+    for batch_start in range(0, num_samples, batch_size):
+        batch = buffer[: min(batch_size, num_samples - batch_start)]
+        batch[:] = series
+        rows = batch.reshape(-1, series.shape[1])
+        batch_inactive = ~active[batch_start : batch_start + len(batch)].reshape(
+            len(rows), num_slices
+        )
+        for start_idx, end_idx, idx in runs:
+            # Rows (sample and channel) where the slice is deactivated
+            inactive_rows = np.flatnonzero(batch_inactive[:, idx])
+            if len(inactive_rows) == 0:
+                continue
+            if replacement_method == "silence":
+                replacement = 0
+            elif replacement_method == "noise":
+                # use random noise as inactive
+                channels = row_channels[inactive_rows]
+                replacement = np.random.uniform(
+                    noise_low[channels],
+                    noise_high[channels],
+                    (len(inactive_rows), end_idx - start_idx),
+                )
+            elif replacement_method == "mean":
+                replacement = slice_means[row_channels[inactive_rows], idx, None]
+            else:
+                replacement = total_means[row_channels[inactive_rows]]
+            rows[inactive_rows, start_idx:end_idx] = replacement
+        predictions.append(
+            classifier_fn(batch.reshape((len(batch),) + timeseries.shape))
+        )
+    return np.concatenate(predictions)
+
+
 def perturb_total_mean(m, start_idx, end_idx, channels):
     # univariate
     if len(m.shape) == 1:
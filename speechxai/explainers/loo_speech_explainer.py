@@ -1,11 +1,21 @@
 """LOO Speech Explainer module"""
 import numpy as np
 from typing import Dict, List, Union, Tuple
-from pydub import AudioSegment
-from speechxai.utils import pydub_to_np, print_log
-from IPython.display import display
+from speechxai.utils import print_log
 from speechxai.explainers.explanation_speech import ExplanationSpeech
-from speechxai.explainers.utils_removal import transcribe_audio, remove_word
+from speechxai.explainers.utils_removal import (
+    SAME_LENGTH_REMOVAL_TYPES,
+    transcribe_audio,
+    get_leave_one_out_matrix,
+    remove_words_from_waveform,
+)
+from speechxai.explainers.perturbations import (
+    SpanPerturbation,
+    predict_perturbed_audios,
+)
+from speechxai.explainers.alignment_providers import get_word_alignment
+from speechxai.audio_io import LoadedAudio, load_audio
+from speechxai.model_helpers.utils_inference import incremental_reference
 
 
 class LOOSpeechExplainer:
@@ -14,86 +24,269 @@ class LOOSpeechExplainer:
     def __init__(self, model_helper):
         self.model_helper = model_helper
 
+    def get_words(
+        self, loaded_audio: LoadedAudio, words_trascript: List = None
+    ) -> List[Dict[str, Union[str, float]]]:
+        """
+        The words of the audio with their start and end times, if not given (see alignment_providers.get_word_alignment)
+        """
+        if words_trascript is None:
+            text, words_trascript = get_word_alignment(
+                audio_path=loaded_audio.path,
+                language=self.model_helper.language,
+                device=self.model_helper.device.type,
+            )
+        return words_trascript
+
     def remove_words(
         self,
-        audio_path: str,
+        audio_path: Union[str, LoadedAudio],
         removal_type: str = "nothing",
         words_trascript: List = None,
         display_audio: bool = False,
-    ) -> Tuple[List[AudioSegment], List[Dict[str, Union[str, float]]]]:
+    ) -> Tuple[List[np.ndarray], List[Dict[str, Union[str, float]]]]:
         """
-        Remove words from audio using pydub, by replacing them with:
+        Remove words from audio, on the waveform (see utils_removal.remove_spans), by replacing them with:
         - nothing
         - silence
         - white noise
         - pink noise
         """
 
-        ## Transcribe audio
+        ## Load audio (decoded once, see audio_io.load_audio)
+        loaded_audio = load_audio(audio_path)
+        audio = loaded_audio.samples
 
-        if words_trascript is None:
-            text, words_trascript = transcribe_audio(
-                audio_path=audio_path,
-                device=self.model_helper.device.type,
-                batch_size=2,
-                compute_type="float32",
-                language=self.model_helper.language,
-            )
-
-        ## Load audio as pydub.AudioSegment
-        audio = AudioSegment.from_wav(audio_path)
+        ## Transcribe audio
+        words_trascript = self.get_words(loaded_audio, words_trascript)
 
         ## Remove word
         audio_no_words = []
 
         for word in words_trascript:
-            audio_removed = remove_word(audio, word, removal_type)
+            audio_removed = remove_words_from_waveform(
+                audio, [word], removal_type, loaded_audio.frame_rate
+            )
 
-            audio_no_words.append(pydub_to_np(audio_removed)[0])
+            audio_no_words.append(audio_removed)
 
             if display_audio:
                 print_log(word["word"])
-                display(audio_removed)
+                from IPython.display import Audio, display
+
+                display(Audio(audio_removed.squeeze(), rate=loaded_audio.frame_rate))
 
         return audio_no_words, words_trascript
 
     def compute_explanation(
         self,
-        audio_path: str,
+        audio_path: Union[str, LoadedAudio],
         target_class=None,
-        removal_type: str = None,
+        removal_type: Union[str, List[str]] = None,
         words_trascript: List = None,
-    ) -> ExplanationSpeech:
+    ) -> Union[ExplanationSpeech, List[ExplanationSpeech]]:
         """
         Computes the importance of each word in the audio.
+        If removal_type is a list of removal types, returns one explanation per removal type (see compute_explanations).
         """
+        if isinstance(removal_type, (list, tuple)):
+            return self.compute_explanations(
+                audio_path, removal_type, target_class, words_trascript
+            )
+
+        loaded_audio = load_audio(audio_path)
 
         ## Get modified audio by leaving a single word out and the words
-        modified_audios, words = self.remove_words(
-            audio_path, removal_type, words_trascript=words_trascript
+        perturbations, words = self.get_perturbations(
+            loaded_audio, removal_type, words_trascript=words_trascript
         )
 
-        logits_modified = self.model_helper.predict(modified_audios)
+        logits_original, logits_modified = self.predict_perturbations(
+            loaded_audio.samples, perturbations
+        )
 
-        audio = pydub_to_np(AudioSegment.from_wav(audio_path))[0]
+        return self.get_explanation(
+            loaded_audio.path,
+            words,
+            logits_original,
+            logits_modified,
+            target_class,
+            removal_type,
+        )
 
-        logits_original = self.model_helper.predict([audio])
+    def compute_explanations(
+        self,
+        audio_path: Union[str, LoadedAudio],
+        removal_types: List[str],
+        target_class=None,
+        words_trascript: List = None,
+    ) -> List[ExplanationSpeech]:
+        """
+        Computes the importance of each word in the audio for each removal type, in the order of removal_types.
+        The audio is decoded and aligned once, and the audios with a word removed by all the removal types
+        are predicted together with the original audio in a single call.
+        """
+        loaded_audio = load_audio(audio_path)
+        words = self.get_words(loaded_audio, words_trascript)
+        n_words = len(words)
+        removal_types = list(dict.fromkeys(removal_types))
 
-        # Check if single label or multilabel scenario as for FSC
-        n_labels = self.model_helper.n_labels
+        ## The same-length removal types are the rows of a single matrix, followed by the original audio
+        matrix_types = (
+            [t for t in removal_types if t in SAME_LENGTH_REMOVAL_TYPES]
+            if loaded_audio.channels == 1
+            else []
+        )
+        if matrix_types:
+            matrix = get_leave_one_out_matrix(
+                loaded_audio.samples, words, matrix_types, loaded_audio.frame_rate
+            )
+            audios = list(matrix)
+        else:
+            audios = [loaded_audio.samples]
+        rows = {
+            removal_type: slice(t * n_words, (t + 1) * n_words)
+            for t, removal_type in enumerate(matrix_types)
+        }
+        original_row = slice(len(audios) - 1, len(audios))
+
+        ## The other removal types (e.g., nothing) as span perturbations, materialized at inference
+        for removal_type in removal_types:
+            if removal_type not in rows:
+                rows[removal_type] = slice(len(audios), len(audios) + n_words)
+                audios.extend(
+                    self.get_span_perturbations(loaded_audio, removal_type, words)
+                )
+
+        with incremental_reference(self.model_helper, loaded_audio.samples):
+            logits = predict_perturbed_audios(self.model_helper, audios)
+
+        logits_original = self._take(logits, original_row)
+        return [
+            self.get_explanation(
+                loaded_audio.path,
+                words,
+                logits_original,
+                self._take(logits, rows[removal_type]),
+                target_class,
+                removal_type,
+            )
+            for removal_type in removal_types
+        ]
+
+    def _take(self, logits, rows: slice):
+        """
+        The predictions of the rows (for each label in the multilabel scenario, as for FSC)
+        """
+        if self.model_helper.n_labels > 1:
+            return [logits_label[rows] for logits_label in logits]
+        return logits[rows]
 
+    def get_span_perturbations(
+        self, loaded_audio: LoadedAudio, removal_type: str, words: List
+    ) -> List[SpanPerturbation]:
+        """
+        The audios with a word removed as span perturbations: they are materialized only at inference (see perturbations.SpanPerturbation)
+        """
+        return [
+            SpanPerturbation.from_words(
+                loaded_audio.samples, [word], removal_type, loaded_audio.frame_rate
+            )
+            for word in words
+        ]
+
+    def get_perturbations(
+        self,
+        audio_path: Union[str, LoadedAudio],
+        removal_type: str = "silence",
+        words_trascript: List = None,
+    ) -> Tuple[
+        Union[np.ndarray, List[SpanPerturbation]], List[Dict[str, Union[str, float]]]
+    ]:
+        """
+        The audios with a word removed, and the words.
+        For the removal types that keep the length of the audio (silence, white noise, pink noise), they are the rows of a single array
+        of shape [n_words + 1, n_samples], with the original audio as last row (see utils_removal.get_leave_one_out_matrix).
+        Otherwise (nothing), a list of span perturbations (see get_span_perturbations).
+        """
+        loaded_audio = load_audio(audio_path)
+        words = self.get_words(loaded_audio, words_trascript)
+
+        if removal_type in SAME_LENGTH_REMOVAL_TYPES and loaded_audio.channels == 1:
+            perturbations = get_leave_one_out_matrix(
+                loaded_audio.samples, words, removal_type, loaded_audio.frame_rate
+            )
+            return perturbations, words
+        return self.get_span_perturbations(loaded_audio, removal_type, words), words
+
+    def predict_perturbations(
+        self,
+        audio: np.ndarray,
+        perturbations: Union[np.ndarray, List[SpanPerturbation]],
+    ):
+        """
+        Predicts the original audio and the audios with a word removed (see get_perturbations).
+        The rows of a leave-one-out matrix, original audio included, are predicted in a single call.
+        """
+        if not isinstance(perturbations, np.ndarray):
+            return self.predict_audios(audio, perturbations)
+
+        with incremental_reference(self.model_helper, audio):
+            logits = self.model_helper.predict(perturbations)
+
+        n_modified = len(perturbations) - 1
+        return (
+            self._take(logits, slice(n_modified, None)),
+            self._take(logits, slice(None, n_modified)),
+        )
+
+    def predict_audios(
+        self,
+        audio: np.ndarray,
+        modified_audios: List[Union[np.ndarray, SpanPerturbation]],
+    ):
+        """
+        Predicts the original audio and the audios with a word removed (audios or span perturbations, materialized in batches).
+        """
+        # With incremental encoding, only the frames of the removed word are recomputed (not for the removal type "nothing")
+        with incremental_reference(self.model_helper, audio):
+            logits_modified = predict_perturbed_audios(
+                self.model_helper, modified_audios
+            )
+
+        logits_original = self.model_helper.predict([audio])
+        return logits_original, logits_modified
+
+    def get_targets(self, logits_original, target_class=None):
+        """
+        The target class (one per label in the multilabel scenario, as for FSC): target_class if given, otherwise the predicted class
+        """
         # TODO
         if target_class is not None:
-            targets = target_class
+            return target_class
 
-        else:
-            if n_labels > 1:
-                # Multilabel scenario as for FSC
-                targets = [
-                    np.argmax(logits_original[i], axis=1)[0] for i in range(n_labels)
-                ]
-            else:
-                targets = np.argmax(logits_original, axis=1)[0]
+        n_labels = self.model_helper.n_labels
+        if n_labels > 1:
+            # Multilabel scenario as for FSC
+            return [np.argmax(logits_original[i], axis=1)[0] for i in range(n_labels)]
+        return np.argmax(logits_original, axis=1)[0]
+
+    def get_explanation(
+        self,
+        audio_path: str,
+        words: List[Dict[str, Union[str, float]]],
+        logits_original,
+        logits_modified,
+        target_class=None,
+        removal_type: str = None,
+    ) -> ExplanationSpeech:
+        """
+        Importance of each word: difference between the probability of the target class of the original audio and of the audio without the word.
+        """
+        # Check if single label or multilabel scenario as for FSC
+        n_labels = self.model_helper.n_labels
+
+        targets = self.get_targets(logits_original, target_class)
 
         ## Get the most important word for each class (action, object, location)
 
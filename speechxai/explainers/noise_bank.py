@@ -0,0 +1,178 @@
+"""Process-wide bank of the noises used to remove words and to perturb the audios"""
+import os
+import threading
+from typing import Dict, Optional
+import numpy as np
+
+# Noise files of the removal types (decoded once per sampling rate, see NoiseBank)
+NOISE_FILES = {
+    "white noise": os.path.join(os.path.dirname(__file__), "white_noise.mp3"),
+    "pink noise": os.path.join(os.path.dirname(__file__), "pink_noise.mp3"),
+}
+
+# RMS of the noise files, used for the synthetic noises so that they have the same level
+NOISE_RMS = {
+    "white noise": 0.0024,
+    "pink noise": 0.048,
+}
+
+# Duration of the synthetic noises. Longer noises are tiled
+SYNTHETIC_NOISE_SECONDS = 10
+
+
+def white_noise(n_samples: int, rms: float = 1.0, seed: int = None) -> np.ndarray:
+    """
+    Gaussian white noise with the given RMS, as np.float32
+    """
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(n_samples) * rms).astype(np.float32)
+
+
+def pink_noise(n_samples: int, rms: float = 1.0, seed: int = None) -> np.ndarray:
+    """
+    Pink (1/f) noise with the given RMS, as np.float32, by shaping the spectrum of white noise
+    """
+    rng = np.random.default_rng(seed)
+    spectrum = np.fft.rfft(rng.standard_normal(n_samples))
+    frequencies = np.arange(len(spectrum), dtype=np.float64)
+    # Power 1/f: amplitude 1/sqrt(f). No DC component
+    frequencies[0] = np.inf
+    noise = np.fft.irfft(spectrum / np.sqrt(frequencies), n=n_samples)
+    noise *= rms / np.sqrt(np.mean(noise**2))
+    return noise.astype(np.float32)
+
+
+SYNTHETIC_NOISES = {"white noise": white_noise, "pink noise": pink_noise}
+
+
+def _resample(samples: np.ndarray, frame_rate: int, sampling_rate: int) -> np.ndarray:
+    n_samples = int(round(len(samples) * sampling_rate / frame_rate))
+    return np.interp(
+        np.arange(n_samples) * (frame_rate / sampling_rate),
+        np.arange(len(samples)),
+        samples,
+    ).astype(np.float32)
+
+
+def decode_noise(noise_path: str, sampling_rate: int) -> np.ndarray:
+    """
+    Noise file as mono np.float32 at the given sampling rate.
+    It is decoded with soundfile if available (no ffmpeg process), otherwise with pydub
+    """
+    try:
+        import soundfile
+
+        samples, frame_rate = soundfile.read(
+            noise_path, dtype="float32", always_2d=True
+        )
+        samples = samples.mean(axis=1)
+    except (ImportError, RuntimeError):
+        # RuntimeError: libsndfile without MP3 support
+        from pydub import AudioSegment
+        from speechxai.utils import pydub_to_np
+
+        samples, frame_rate = pydub_to_np(AudioSegment.from_mp3(noise_path))
+        samples = samples.mean(axis=1)
+
+    if frame_rate != sampling_rate:
+        samples = _resample(samples, frame_rate, sampling_rate)
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+class NoiseBank:
+    """
+    Noises of the removal types ("white noise", "pink noise"), decoded (or synthesized) once per sampling rate
+    and served with any length: a view of the noise when it is long enough, otherwise the noise tiled.
+    """
+
+    def __init__(
+        self,
+        synthetic: bool = False,
+        seed: int = 42,
+        noise_files: Dict[str, str] = None,
+    ):
+        """
+        Args:
+            synthetic: if True, the noises are generated (seeded, see white_noise and pink_noise) instead of decoded from the noise files
+            seed: seed of the synthetic noises and of the random offsets
+            noise_files: noise file of each noise type. If None, NOISE_FILES
+        """
+        self.synthetic = synthetic
+        self.seed = seed
+        self.noise_files = NOISE_FILES if noise_files is None else noise_files
+        self._noises = {}
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def get_base_noise(self, noise_type: str, sampling_rate: int) -> np.ndarray:
+        """
+        The whole noise of the noise type at the sampling rate (read-only)
+        """
+        key = (noise_type, sampling_rate)
+        with self._lock:
+            if key not in self._noises:
+                if self.synthetic:
+                    if noise_type not in SYNTHETIC_NOISES:
+                        raise ValueError(f"No synthetic noise {noise_type}")
+                    noise = SYNTHETIC_NOISES[noise_type](
+                        SYNTHETIC_NOISE_SECONDS * sampling_rate,
+                        rms=NOISE_RMS[noise_type],
+                        seed=self.seed,
+                    )
+                else:
+                    if noise_type not in self.noise_files:
+                        raise ValueError(
+                            f"No noise file for {noise_type}. Choose between {list(self.noise_files)}"
+                        )
+                    noise = decode_noise(self.noise_files[noise_type], sampling_rate)
+                noise.flags.writeable = False
+                self._noises[key] = noise
+            return self._noises[key]
+
+    def get_noise(
+        self,
+        noise_type: str,
+        n_samples: int,
+        sampling_rate: int,
+        offset: Optional[int] = 0,
+    ) -> np.ndarray:
+        """
+        n_samples of noise (read-only), starting at offset of the noise (wrapping around it).
+
+        Args:
+            noise_type: "white noise" or "pink noise"
+            n_samples: number of samples
+            sampling_rate: sampling rate of the noise
+            offset: first sample of the noise. If None, a random offset (seeded by the seed of the bank)
+        """
+        noise = self.get_base_noise(noise_type, sampling_rate)
+        if offset is None:
+            with self._lock:
+                offset = int(self._rng.integers(len(noise)))
+        offset = offset % len(noise)
+
+        if offset + n_samples <= len(noise):
+            return noise[offset : offset + n_samples]
+        tiled = np.take(noise, np.arange(offset, offset + n_samples), mode="wrap")
+        tiled.flags.writeable = False
+        return tiled
+
+    def clear(self):
+        with self._lock:
+            self._noises.clear()
+
+
+# Noise bank of the process (see get_noise_bank)
+_NOISE_BANK = NoiseBank()
+
+
+def get_noise_bank() -> NoiseBank:
+    return _NOISE_BANK
+
+
+def set_noise_bank(noise_bank: NoiseBank):
+    """
+    Set the noise bank of the process. E.g., set_noise_bank(NoiseBank(synthetic=True)) to never decode the noise files
+    """
+    global _NOISE_BANK
+    _NOISE_BANK = noise_bank
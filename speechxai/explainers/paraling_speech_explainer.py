@@ -3,17 +3,9 @@ import numpy as np
 from typing import Dict, List, Union, Tuple
 from pydub import AudioSegment
 from speechxai.utils import pydub_to_np, print_log
-from IPython.display import display
 from speechxai.explainers.explanation_speech import ExplanationSpeech
-from audiomentations import (
-    Compose,
-    TimeStretch,
-    PitchShift,
-    RoomSimulator,
-    AddBackgroundNoise,
-    PolarityInversion,
-)
-import pandas as pd
+from speechxai.audio_io import LoadedAudio, load_audio
+from speechxai.explainers.noise_bank import get_noise_bank
 import os
 
 # If True, We use the audiostretchy library to perform time stretching
@@ -24,6 +16,28 @@ USE_ADD_NOISE_TORCHAUDIO = True
 REFERENCE_STR = "-"
 
 
+def _open_audio_stretch(loaded_audio: LoadedAudio):
+    """
+    AudioStretch with the samples of the audio. The 16-bit PCM samples of the decoded audio are used without copy,
+    instead of reopening the file for each stretch ratio. The other formats are opened by AudioStretch from the file.
+    """
+    from audiostretchy.stretch import AudioStretch
+
+    audio_stretch = AudioStretch()
+    if loaded_audio.pcm.dtype != np.int16:
+        audio_stretch.open(loaded_audio.path)
+        return audio_stretch
+
+    # As AudioStretch.open_wav: the header fields and the PCM data, that pcm_decode views as np.int16 (in_samples and samples)
+    audio_stretch.nchannels = loaded_audio.channels
+    audio_stretch.sampwidth = 2
+    audio_stretch.framerate = loaded_audio.frame_rate
+    audio_stretch.nframes = len(loaded_audio)
+    audio_stretch.pcm = loaded_audio.int16.reshape(-1)
+    audio_stretch.pcm_decode()
+    return audio_stretch
+
+
 def _tmp_log1(
     verbose_target,
     original_gt,
@@ -72,6 +86,15 @@ class ParalinguisticSpeechExplainer:
         """
         Creating a list of augmentations for each perturb_paraling type
         """
+        from audiomentations import (
+            Compose,
+            TimeStretch,
+            PitchShift,
+            RoomSimulator,
+            AddBackgroundNoise,
+            PolarityInversion,
+        )
+
         if "pitch shifting" in perturbation_type:
             augment = Compose(
                 [
@@ -140,12 +163,9 @@ class ParalinguisticSpeechExplainer:
         return perturbed_audio.squeeze()
 
     def time_stretching_augmentation_AudioStretch(
-        self, audio_path: str, perturbation_value: float
+        self, audio_path: Union[str, LoadedAudio], perturbation_value: float
     ):
-        from audiostretchy.stretch import AudioStretch
-
-        audio_stretch = AudioStretch()
-        audio_stretch.open(audio_path)
+        audio_stretch = _open_audio_stretch(load_audio(audio_path))
         audio_stretch.stretch(ratio=perturbation_value)
         perturbated_audio_samples = np.array(audio_stretch.samples, dtype=np.float32)
         return perturbated_audio_samples
@@ -172,27 +192,20 @@ class ParalinguisticSpeechExplainer:
         """
 
         import torchaudio.functional as F
-        from copy import deepcopy
         import torch
 
-        WHITE_NOISE = os.path.join(os.path.dirname(__file__), "white_noise.mp3")
-
-        noise_as = AudioSegment.from_mp3(WHITE_NOISE)
-        noise, frame_rate = pydub_to_np(noise_as)
+        # The white noise is decoded once and tiled to the length of the audio (see noise_bank)
+        noise = get_noise_bank().get_noise(
+            "white noise",
+            original_speech.size,
+            self.model_helper.feature_extractor.sampling_rate,
+        )
 
         # Reshape and convert to torch tensor
         original_speech = torch.tensor(original_speech.reshape(1, -1))
         # Reshape and convert to torch tensor
-        noise = torch.tensor(noise.reshape(1, -1))
-
-        def extend_noise(noise, desired_length):
-            noise_new = deepcopy(noise)
-            while noise_new.shape[1] < desired_length:
-                noise_new = torch.concat([noise_new[0], noise[0]]).reshape(1, -1)
-            noise_new = noise_new[:, :desired_length]
-            return noise_new
+        noise_eq_length = torch.tensor(noise.reshape(1, -1))
 
-        noise_eq_length = extend_noise(noise, original_speech.shape[1])
         snr_dbs = torch.tensor([noise_rate, 10, 3])
         noisy_speeches = F.add_noise(original_speech, noise_eq_length, snr_dbs)
         noisy_speech = noisy_speeches[0:1].numpy()
@@ -217,7 +230,7 @@ class ParalinguisticSpeechExplainer:
 
     def perturbe_waveform(
         self,
-        audio_path: str,
+        audio_path: Union[str, LoadedAudio],
         perturbation_type: str,
         return_perturbations=False,
         verbose: bool = False,
@@ -231,9 +244,10 @@ class ParalinguisticSpeechExplainer:
         - noise
         """
 
-        ## Load audio as pydub.AudioSegment
-        audio_as = AudioSegment.from_wav(audio_path)
-        audio, frame_rate = pydub_to_np(audio_as)
+        ## Load audio as pydub.AudioSegment (decoded once, see audio_io.load_audio)
+        loaded_audio = load_audio(audio_path)
+        audio_as = loaded_audio.segment
+        audio, frame_rate = loaded_audio.samples, loaded_audio.frame_rate
 
         ## Perturbate audio
         perturbated_audios = []
@@ -320,7 +334,7 @@ class ParalinguisticSpeechExplainer:
             if "time stretching" in perturbation_type:
                 if USE_AUDIOSTRETCH:
                     perturbated_audio = self.time_stretching_augmentation_AudioStretch(
-                        audio_path, perturbation_value
+                        loaded_audio, perturbation_value
                     )
                 else:
                     perturbated_audio = self.time_stretching_augmentation(
@@ -364,7 +378,7 @@ class ParalinguisticSpeechExplainer:
 
     def compute_explanation(
         self,
-        audio_path: str,
+        audio_path: Union[str, LoadedAudio],
         target_class=None,
         perturbation_type: str = None,
         verbose: bool = False,
@@ -374,8 +388,10 @@ class ParalinguisticSpeechExplainer:
         Computes the importance of each paralinguistic feature in the audio.
         """
 
+        loaded_audio = load_audio(audio_path)
+
         modified_audios = self.perturbe_waveform(
-            audio_path,
+            loaded_audio,
             perturbation_type,
             verbose=verbose,
             verbose_target=verbose_target,
@@ -385,9 +401,7 @@ class ParalinguisticSpeechExplainer:
 
         logits_modified = self.model_helper.predict(modified_audios)
 
-        audio = pydub_to_np(AudioSegment.from_wav(audio_path))[0]
-
-        logits_original = self.model_helper.predict([audio])
+        logits_original = self.model_helper.predict([loaded_audio.samples])
 
         # Check if single label or multilabel scenario as for FSC
         n_labels = self.model_helper.n_labels
@@ -443,15 +457,18 @@ class ParalinguisticSpeechExplainer:
             scores=scores,
             explainer=self.NAME,
             target=targets if n_labels > 1 else [targets],
-            audio_path=audio_path,
+            audio_path=loaded_audio.path,
         )
 
         return explanation
 
     def explain_variations(self, audio_path, perturbation_types, target_class=None):
+        import pandas as pd
+
         n_labels = self.model_helper.n_labels
 
-        audio = pydub_to_np(AudioSegment.from_wav(audio_path))[0]
+        loaded_audio = load_audio(audio_path)
+        audio = loaded_audio.samples
 
         original_gt = self.model_helper.get_predicted_probs(audio=audio)
 
@@ -466,7 +483,7 @@ class ParalinguisticSpeechExplainer:
         perturbation_df_by_type = {}
         for perturbation_type in perturbation_types:
             perturbated_audios, perturbations = self.perturbe_waveform(
-                audio_path, perturbation_type, return_perturbations=True
+                loaded_audio, perturbation_type, return_perturbations=True
             )
 
             if "time stretching" in perturbation_type:
@@ -521,7 +538,7 @@ class ParalinguisticSpeechExplainer:
         perturbated_audio: np.ndarray,
         verbose_target: int,
     ):
-        from IPython.display import Audio
+        from IPython.display import Audio, display
 
         # Display the perturbated audio an show its info for a single class
         # For multi label scenario, we show it for a single class: verbose_target
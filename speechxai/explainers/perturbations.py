@@ -0,0 +1,163 @@
+"""Perturbed audios stored as span edits of a base waveform, materialized in batches right before inference"""
+from typing import Callable, Iterator, List, Tuple, Union
+import numpy as np
+from speechxai.explainers.utils_removal import (
+    REMOVAL_TYPES,
+    WORD_PADDING,
+    get_word_spans,
+    remove_spans,
+)
+from speechxai.model_helpers.utils_inference import MAX_BATCH_SAMPLES
+
+
+class SpanPerturbation:
+    """
+    An audio with spans of samples removed (see utils_removal.remove_spans), stored as a reference to the base waveform and the spans.
+    The samples are written only when the perturbation is materialized, so a list of perturbations takes (almost) no memory.
+    """
+
+    def __init__(
+        self,
+        base: np.ndarray,
+        spans: np.ndarray,
+        removal_type: str = "silence",
+        sampling_rate: int = 16000,
+    ):
+        """
+        Args:
+            base: waveform of shape [n_samples] or [n_samples, channels]. It is not modified
+            spans: array of shape [n_spans, 2], sorted and not overlapping (see utils_removal.get_word_spans)
+            removal_type: nothing, silence, white noise or pink noise
+            sampling_rate: sampling rate of the audio, for the noise
+        """
+        if removal_type not in REMOVAL_TYPES:
+            raise ValueError(
+                f"Removal type {removal_type} not supported, choose between {REMOVAL_TYPES}"
+            )
+        self.base = base
+        self.spans = np.asarray(spans, dtype=np.int64).reshape(-1, 2)
+        self.removal_type = removal_type
+        self.sampling_rate = sampling_rate
+
+    @classmethod
+    def from_words(
+        cls,
+        base: np.ndarray,
+        words: List,
+        removal_type: str = "silence",
+        sampling_rate: int = 16000,
+        padding: Tuple[float, float] = WORD_PADDING,
+    ) -> "SpanPerturbation":
+        """
+        The audio with the words (with their start and end times in seconds) removed, as utils_removal.remove_words_from_waveform
+        """
+        spans = get_word_spans(words, sampling_rate, len(base), padding)
+        return cls(base, spans, removal_type, sampling_rate)
+
+    def __len__(self) -> int:
+        if self.removal_type == "nothing":
+            return len(self.base) - int((self.spans[:, 1] - self.spans[:, 0]).sum())
+        return len(self.base)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (len(self),) + self.base.shape[1:]
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape))
+
+    def materialize(self, out: np.ndarray = None) -> np.ndarray:
+        """
+        The perturbed audio, written in out if given (an array of shape self.shape)
+        """
+        return remove_spans(
+            self.base, self.spans, self.removal_type, self.sampling_rate, out=out
+        )
+
+
+Perturbation = Union[np.ndarray, SpanPerturbation]
+
+
+def materialize_batches(
+    perturbations: List[Perturbation], max_batch_samples: int = MAX_BATCH_SAMPLES
+) -> Iterator[List[np.ndarray]]:
+    """
+    Yields the perturbed audios in batches of at most max_batch_samples samples (at least one audio per batch).
+    The span perturbations are materialized in a single buffer reused across the batches, so the memory depends on
+    max_batch_samples and not on the number of perturbations. The audios of a batch are views of the buffer: they are
+    overwritten by the next batch. The audios already materialized (np.ndarray) are yielded as they are.
+    """
+    batches, batch, batch_samples = [], [], 0
+    for perturbation in perturbations:
+        if batch and batch_samples + perturbation.size > max_batch_samples:
+            batches.append(batch)
+            batch, batch_samples = [], 0
+        batch.append(perturbation)
+        batch_samples += perturbation.size
+    if batch == []:
+        return
+    batches.append(batch)
+
+    buffer_size = max(
+        sum(p.size for p in batch if isinstance(p, SpanPerturbation))
+        for batch in batches
+    )
+    dtype = next(
+        (p.base.dtype for p in perturbations if isinstance(p, SpanPerturbation)),
+        np.float32,
+    )
+    buffer = np.empty(buffer_size, dtype=dtype)
+
+    for batch in batches:
+        audios, offset = [], 0
+        for perturbation in batch:
+            if isinstance(perturbation, SpanPerturbation):
+                out = buffer[offset : offset + perturbation.size].reshape(
+                    perturbation.shape
+                )
+                audios.append(perturbation.materialize(out=out))
+                offset += perturbation.size
+            else:
+                audios.append(perturbation)
+        yield audios
+
+
+def predict_perturbed_audios(
+    model_helper,
+    perturbations: List[Perturbation],
+    predict_function: Callable = None,
+    max_batch_samples: int = None,
+):
+    """
+    Predictions of the perturbed audios, materialized one batch at a time right before inference (see materialize_batches).
+    The output has the format of model_helper.predict (for FSC, a list with the probabilities of each label).
+
+    Args:
+        model_helper: model helper
+        perturbations: span perturbations (SpanPerturbation) or audios
+        predict_function: function that predicts a list of audios. By default, model_helper.predict
+        max_batch_samples: samples materialized at once. By default, the batch budget of the model helper
+    """
+    if predict_function is None:
+        predict_function = model_helper.predict
+    if max_batch_samples is None:
+        max_batch_samples = getattr(
+            model_helper, "max_batch_samples", MAX_BATCH_SAMPLES
+        )
+    if len(perturbations) == 0:
+        return predict_function([])
+
+    outputs = [
+        predict_function(audios)
+        for audios in materialize_batches(perturbations, max_batch_samples)
+    ]
+    if len(outputs) == 1:
+        return outputs[0]
+    if isinstance(outputs[0], (list, tuple)):
+        # Multilabel scenario as for FSC
+        return [
+            np.concatenate([output[label] for output in outputs])
+            for label in range(len(outputs[0]))
+        ]
+    return np.concatenate(outputs)
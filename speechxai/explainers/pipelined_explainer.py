@@ -0,0 +1,221 @@
+"""Pipelined LOO explanations of many audios: alignment, word removal and inference run concurrently"""
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Union
+from speechxai.explainers.explanation_speech import ExplanationSpeech
+from speechxai.explainers.loo_speech_explainer import LOOSpeechExplainer
+from speechxai.explainers.alignment_providers import get_word_alignment
+from speechxai.audio_io import LoadedAudio, get_audio_path, load_audio
+
+# End of the stream of items of a stage
+_DONE = object()
+
+
+class StageStats:
+    """
+    Time spent by a stage of the pipeline working, waiting for its input (starved) and waiting for the next stage (blocked)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_time = 0.0
+        self.starved_time = 0.0
+        self.blocked_time = 0.0
+
+    def as_dict(self, wall_time: float) -> Dict[str, float]:
+        return {
+            "items": self.items,
+            "busy_s": round(self.busy_time, 4),
+            "starved_s": round(self.starved_time, 4),
+            "blocked_s": round(self.blocked_time, 4),
+            # Fraction of the wall time of the run spent working
+            "utilization": round(self.busy_time / wall_time, 4) if wall_time else 0.0,
+        }
+
+
+class PipelinedLOOExplainer:
+    """
+    Computes the LOO explanations (see LOOSpeechExplainer) of a list of audios in a pipeline of three stages, one thread each:
+    - alignment: the words of the audio (see alignment_providers.get_word_alignment)
+    - removal: the audios with a word removed (see LOOSpeechExplainer.get_perturbations)
+    - inference: the predictions of the model and the explanation
+
+    While the model predicts an audio, the next audios are aligned and perturbed.
+    The stages are connected by bounded queues: a stage waits when the next one is queue_size items behind (backpressure),
+    so that at most a few perturbed audios are kept in memory.
+    After each run, stats reports how busy each stage was. The slowest stage has the highest utilization.
+    """
+
+    NAME = LOOSpeechExplainer.NAME
+
+    def __init__(self, model_helper, queue_size: int = 2):
+        """
+        Args:
+            model_helper: model helper (ModelHelperER, ModelHelperFSC, ModelHelperITALIC or a wrapper of them)
+            queue_size: maximum number of items waiting between two stages
+        """
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        self.model_helper = model_helper
+        self.loo_explainer = LOOSpeechExplainer(model_helper)
+        self.queue_size = queue_size
+        self.stats = {}
+
+    def _align(self, item):
+        index, audio_path, words = item
+        if words is None:
+            _, words = get_word_alignment(
+                audio_path=get_audio_path(audio_path),
+                language=self.model_helper.language,
+                device=self.model_helper.device.type,
+            )
+        return index, audio_path, words
+
+    def _remove_words(self, item, removal_type: str):
+        index, audio_path, words = item
+        loaded_audio = load_audio(audio_path)
+        perturbations, words = self.loo_explainer.get_perturbations(
+            loaded_audio, removal_type, words_trascript=words
+        )
+        return index, loaded_audio.path, words, loaded_audio.samples, perturbations
+
+    def _explain(self, item, removal_type: str, target_classes: Optional[List]):
+        index, audio_path, words, audio, perturbations = item
+        logits_original, logits_modified = self.loo_explainer.predict_perturbations(
+            audio, perturbations
+        )
+        explanation = self.loo_explainer.get_explanation(
+            audio_path,
+            words,
+            logits_original,
+            logits_modified,
+            None if target_classes is None else target_classes[index],
+            removal_type,
+        )
+        return index, explanation
+
+    def _run_stage(
+        self,
+        function: Callable,
+        stats: StageStats,
+        in_queue: queue.Queue,
+        out_queue: queue.Queue,
+        stop: threading.Event,
+        errors: List[BaseException],
+    ):
+        while True:
+            start = time.perf_counter()
+            item = in_queue.get()
+            stats.starved_time += time.perf_counter() - start
+            if item is _DONE:
+                break
+            # After an error, the remaining items are drained without processing them, so that the previous stages are not blocked
+            if stop.is_set():
+                continue
+
+            start = time.perf_counter()
+            try:
+                result = function(item)
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+                continue
+            finally:
+                stats.busy_time += time.perf_counter() - start
+            stats.items += 1
+
+            start = time.perf_counter()
+            out_queue.put(result)
+            stats.blocked_time += time.perf_counter() - start
+        out_queue.put(_DONE)
+
+    def explain(
+        self,
+        audio_paths: List[Union[str, LoadedAudio]],
+        removal_type: str = "silence",
+        target_classes: List = None,
+        words_trascripts: List[List] = None,
+    ) -> List[ExplanationSpeech]:
+        """
+        LOO explanations of the audios, in the order of audio_paths.
+
+        Args:
+            audio_paths: paths of the audios (or audios loaded with audio_io.load_audio)
+            removal_type: nothing, silence, white noise or pink noise (see LOOSpeechExplainer.remove_words)
+            target_classes: target class of each audio. If None, the predicted classes
+            words_trascripts: words of each audio (None for the audios to align with the alignment provider). If None, all audios are aligned
+        """
+        if target_classes is not None and len(target_classes) != len(audio_paths):
+            raise ValueError("target_classes must have one target per audio")
+        if words_trascripts is not None and len(words_trascripts) != len(audio_paths):
+            raise ValueError("words_trascripts must have one transcript per audio")
+
+        stages = [
+            ("alignment", self._align),
+            ("removal", lambda item: self._remove_words(item, removal_type)),
+            (
+                "inference",
+                lambda item: self._explain(item, removal_type, target_classes),
+            ),
+        ]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+        # Unbounded: the explanations are collected by this thread
+        queues.append(queue.Queue())
+        stats = [StageStats(name) for name, _ in stages]
+        stop = threading.Event()
+        errors = []
+
+        threads = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(function, stage_stats, in_queue, out_queue, stop, errors),
+                name=f"speechxai-{name}",
+                daemon=True,
+            )
+            for (name, function), stage_stats, in_queue, out_queue in zip(
+                stages, stats, queues[:-1], queues[1:]
+            )
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        # The source of the pipeline: blocks when the alignment stage is behind
+        for index, audio_path in enumerate(audio_paths):
+            if stop.is_set():
+                break
+            words = None if words_trascripts is None else words_trascripts[index]
+            queues[0].put((index, audio_path, words))
+        queues[0].put(_DONE)
+
+        explanations = [None] * len(audio_paths)
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            index, explanation = item
+            explanations[index] = explanation
+
+        for thread in threads:
+            thread.join()
+        wall_time = time.perf_counter() - start
+
+        self.stats = {
+            "wall_s": round(wall_time, 4),
+            "stages": {
+                stage_stats.name: stage_stats.as_dict(wall_time)
+                for stage_stats in stats
+            },
+        }
+        if errors:
+            raise errors[0]
+        return explanations
+
+    def get_stats(self) -> Dict[str, Union[float, Dict[str, Dict[str, float]]]]:
+        """
+        Wall time of the last run and, for each stage, number of items, busy, starved and blocked time (seconds) and utilization
+        """
+        return self.stats
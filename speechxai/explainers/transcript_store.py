@@ -0,0 +1,139 @@
+"""Persistent cache of the word-level transcripts"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Union
+
+# Default directory of the cache. It can be set with the environment variable SPEECHXAI_CACHE_DIR
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "speechxai")
+
+# Alignment model of whisperx.load_align_model when no model name is given
+DEFAULT_ALIGN_MODEL = "default"
+
+
+def get_file_hash(path: str, chunk_size: int = 2**20) -> str:
+    """
+    Hash of the content of a file, so that renamed or copied audio files share their transcript.
+    """
+    file_hash = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+class TranscriptStore:
+    """
+    SQLite cache of the transcripts and of the aligned words of the audios.
+    Keys are (audio content hash, ASR model, language, alignment model).
+    """
+
+    def __init__(self, cache_dir: str = None):
+        """
+        Args:
+            cache_dir: directory of the database. If None, SPEECHXAI_CACHE_DIR or ~/.cache/speechxai
+        """
+        if cache_dir is None:
+            cache_dir = os.environ.get("SPEECHXAI_CACHE_DIR", DEFAULT_CACHE_DIR)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "transcripts.sqlite")
+        self._lock = threading.Lock()
+
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    audio_hash TEXT NOT NULL,
+                    asr_model TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    align_model TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    words TEXT NOT NULL,
+                    PRIMARY KEY (audio_hash, asr_model, language, align_model)
+                )
+                """)
+
+    @contextmanager
+    def _connect(self):
+        # One connection per operation: the store can be used by several threads and processes
+        connection = sqlite3.connect(self.path, timeout=60)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def __len__(self) -> int:
+        with self._lock, self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+
+    def get(
+        self,
+        audio_hash: str,
+        asr_model: str,
+        language: str,
+        align_model: str = DEFAULT_ALIGN_MODEL,
+    ) -> Optional[Tuple[str, List[Dict[str, Union[str, float]]]]]:
+        """
+        Returns the text and the words with their start and end times, or None if the audio is not in the store.
+        """
+        with self._lock, self._connect() as connection:
+            row = connection.execute(
+                "SELECT text, words FROM transcripts WHERE audio_hash = ? AND asr_model = ? AND language = ? AND align_model = ?",
+                (audio_hash, asr_model, language, align_model),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(
+        self,
+        audio_hash: str,
+        asr_model: str,
+        language: str,
+        text: str,
+        words: List[Dict[str, Union[str, float]]],
+        align_model: str = DEFAULT_ALIGN_MODEL,
+    ):
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    audio_hash,
+                    asr_model,
+                    language,
+                    align_model,
+                    text,
+                    json.dumps(words, default=float),
+                ),
+            )
+
+    def clear(self):
+        with self._lock, self._connect() as connection:
+            connection.execute("DELETE FROM transcripts")
+
+
+# Store used by utils_removal.transcribe_audio, created at the first use (see get_transcript_store)
+_TRANSCRIPT_STORE = None
+_USE_TRANSCRIPT_STORE = True
+
+
+def get_transcript_store() -> Optional[TranscriptStore]:
+    """
+    Store of the transcripts of the process, or None if disabled with set_transcript_store(None)
+    """
+    global _TRANSCRIPT_STORE
+    if _USE_TRANSCRIPT_STORE and _TRANSCRIPT_STORE is None:
+        _TRANSCRIPT_STORE = TranscriptStore()
+    return _TRANSCRIPT_STORE
+
+
+def set_transcript_store(store: Optional[TranscriptStore]):
+    """
+    Set the store of the transcripts of the process (e.g., TranscriptStore(cache_dir) for a corpus). If None, the transcripts are not cached
+    """
+    global _TRANSCRIPT_STORE, _USE_TRANSCRIPT_STORE
+    _TRANSCRIPT_STORE = store
+    _USE_TRANSCRIPT_STORE = store is not None
@@ -1,53 +1,205 @@
 from pydub import AudioSegment
-import whisperx
-import os
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Union, Tuple
+from speechxai.explainers.whisperx_registry import WHISPERX_MODELS
+from speechxai.explainers.transcript_store import get_transcript_store, get_file_hash
+from speechxai.explainers.noise_bank import get_noise_bank
+from speechxai.utils import pydub_to_np
 
+# Sampling rate of whisperx.load_audio and number of samples of a whisper window (30 s)
+WHISPER_SAMPLE_RATE = 16000
+WHISPER_CHUNK_SAMPLES = 30 * WHISPER_SAMPLE_RATE
 
-def remove_specified_words(audio, words, removal_type: str = "nothing"):
+
+# Padding (in seconds) of the removed words, before their start and after their end
+WORD_PADDING = (0.1, 0.04)
+
+REMOVAL_TYPES = ["nothing", "silence", "white noise", "pink noise"]
+
+
+def get_word_spans(
+    words: List[Dict[str, Union[str, float]]],
+    sampling_rate: int,
+    n_samples: int,
+    padding: Tuple[float, float] = WORD_PADDING,
+) -> np.ndarray:
     """
-    Remove a word from audio using pydub, by replacing it with:
-    - nothing
+    Sample indexes [start, end) of the words (with their start and end times in seconds), extended by padding
+    and clipped to the audio. Overlapping spans are merged. Returns an array of shape [n_spans, 2], sorted by start.
+    """
+    if len(words) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    times = np.array([[word["start"], word["end"]] for word in words], dtype=np.float64)
+    times[:, 0] -= padding[0]
+    times[:, 1] += padding[1]
+    # Nearest sample, so that the float error of the times does not shift the spans by one sample
+    spans = np.rint(times * sampling_rate).astype(np.int64)
+    return merge_spans(np.clip(spans, 0, n_samples))
+
+
+def merge_spans(spans: np.ndarray) -> np.ndarray:
+    """
+    Sorts the spans [start, end) and merges the overlapping or adjacent ones. Empty spans are dropped.
+    """
+    spans = spans[spans[:, 1] > spans[:, 0]]
+    if len(spans) <= 1:
+        return spans
+    spans = spans[np.argsort(spans[:, 0], kind="stable")]
+    # A span starts a new group if it starts after the end of all the previous spans
+    ends = np.maximum.accumulate(spans[:, 1])
+    new_group = np.ones(len(spans), dtype=bool)
+    new_group[1:] = spans[1:, 0] > ends[:-1]
+    group_starts = np.flatnonzero(new_group)
+    group_ends = np.append(group_starts[1:], len(spans)) - 1
+    return np.stack([spans[group_starts, 0], ends[group_ends]], axis=1)
+
+
+def remove_spans(
+    audio: np.ndarray,
+    spans: np.ndarray,
+    removal_type: str = "nothing",
+    sampling_rate: int = 16000,
+    out: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Remove the spans of sample indexes [start, end) from the waveform in one pass, by replacing them with:
+    - nothing (the audio gets shorter)
     - silence
     - white noise
-    - pink noise
+    - pink noise (from the noise bank of the process at sampling_rate, see noise_bank)
 
     Args:
-        audio (pydub.AudioSegment): audio
-        word: word to remove with its start and end times
-        removal_type (str, optional): type of removal. Defaults to "nothing".
+        audio: waveform of shape [n_samples] or [n_samples, channels] (e.g., utils.pydub_to_np). It is not modified
+        spans: array of shape [n_spans, 2], sorted and not overlapping (see get_word_spans and merge_spans)
+        removal_type: type of removal
+        sampling_rate: sampling rate of the audio, for the noise
+        out: array where the result is written (e.g., a buffer reused across audios, see perturbations.SpanPerturbation),
+            with the shape of the result. If None, a new array
     """
+    if removal_type not in REMOVAL_TYPES:
+        raise ValueError(
+            f"Removal type {removal_type} not supported, choose between {REMOVAL_TYPES}"
+        )
 
-    from copy import deepcopy
+    if removal_type == "nothing":
+        # Kept intervals between the spans
+        starts = np.concatenate([[0], spans[:, 1]])
+        ends = np.concatenate([spans[:, 0], [len(audio)]])
+        return np.concatenate(
+            [audio[start:end] for start, end in zip(starts, ends)], out=out
+        )
 
-    audio_removed = deepcopy(audio)
+    if out is None:
+        audio_removed = audio.copy()
+    else:
+        audio_removed = out
+        audio_removed[:] = audio
+    for start, end in spans:
+        if removal_type == "silence":
+            audio_removed[start:end] = 0
+        else:
+            noise = get_noise_bank().get_noise(removal_type, end - start, sampling_rate)
+            audio_removed[start:end] = noise if audio.ndim == 1 else noise[:, None]
+    return audio_removed
 
-    a, b = 100, 40
 
-    from IPython.display import display
+def remove_words_from_waveform(
+    audio: np.ndarray,
+    words: List[Dict[str, Union[str, float]]],
+    removal_type: str = "nothing",
+    sampling_rate: int = 16000,
+    padding: Tuple[float, float] = WORD_PADDING,
+) -> np.ndarray:
+    """
+    Remove the words (with their start and end times in seconds) from the waveform in one pass (see remove_spans).
+    Each word is extended by padding, as in remove_word.
+    """
+    spans = get_word_spans(words, sampling_rate, len(audio), padding)
+    return remove_spans(audio, spans, removal_type, sampling_rate)
 
-    for word in words:
-        start = int(word["start"] * 1000)
-        end = int(word["end"] * 1000)
 
-        before_word_audio = audio_removed[: start - a]
-        after_word_audio = audio_removed[end + b :]
+# Removal types that do not change the length of the audio
+SAME_LENGTH_REMOVAL_TYPES = ["silence", "white noise", "pink noise"]
 
-        word_duration = (end - start) + a + b
 
-        if removal_type == "nothing":
-            replace_word_audio = AudioSegment.empty()
-        elif removal_type == "silence":
-            replace_word_audio = AudioSegment.silent(duration=word_duration)
-        elif removal_type == "white noise":
-            sound_path = (os.path.join(os.path.dirname(__file__), "white_noise.mp3"),)
-            replace_word_audio = AudioSegment.from_mp3(sound_path)[:word_duration]
-        elif removal_type == "pink noise":
-            sound_path = (os.path.join(os.path.dirname(__file__), "pink_noise.mp3"),)
-            replace_word_audio = AudioSegment.from_mp3(sound_path)[:word_duration]
+def get_leave_one_out_matrix(
+    audio: np.ndarray,
+    words: List[Dict[str, Union[str, float]]],
+    removal_types: Union[str, List[str]] = "silence",
+    sampling_rate: int = 16000,
+    padding: Tuple[float, float] = WORD_PADDING,
+) -> np.ndarray:
+    """
+    The leave-one-out variants of a mono audio for the same-length removal types (see SAME_LENGTH_REMOVAL_TYPES),
+    in a single array of shape [len(removal_types) * n_words + 1, n_samples]:
+    row t * n_words + i is the audio with the word i removed by the removal type t, and the last row is the original audio.
 
-        audio_removed = before_word_audio + replace_word_audio + after_word_audio
-    return audio_removed
+    Args:
+        audio: waveform of shape [n_samples] or [n_samples, 1]
+        words: words with their start and end times in seconds
+        removal_types: one or more of "silence", "white noise", "pink noise"
+        sampling_rate: sampling rate of the audio, for the word spans and the noise
+        padding: padding of the words in seconds, as in remove_word
+    """
+    if isinstance(removal_types, str):
+        removal_types = [removal_types]
+    for removal_type in removal_types:
+        if removal_type not in SAME_LENGTH_REMOVAL_TYPES:
+            raise ValueError(
+                f"Removal type {removal_type} changes the length of the audio, choose between {SAME_LENGTH_REMOVAL_TYPES}"
+            )
+    audio = audio.reshape(-1)
+    n_words = len(words)
+
+    matrix = np.empty((len(removal_types) * n_words + 1, len(audio)), dtype=audio.dtype)
+    matrix[:] = audio
+    for t, removal_type in enumerate(removal_types):
+        for i, word in enumerate(words):
+            row = matrix[t * n_words + i]
+            for start, end in get_word_spans(
+                [word], sampling_rate, len(audio), padding
+            ):
+                if removal_type == "silence":
+                    row[start:end] = 0
+                else:
+                    row[start:end] = get_noise_bank().get_noise(
+                        removal_type, end - start, sampling_rate
+                    )
+    return matrix
+
+
+def _remove_words_from_segment(
+    audio: AudioSegment, words, removal_type: str
+) -> AudioSegment:
+    samples = pydub_to_np(audio)[0]
+    audio_removed = remove_words_from_waveform(
+        samples, words, removal_type, audio.frame_rate
+    )
+    max_value = 1 << (8 * audio.sample_width - 1)
+    pcm = np.clip(
+        np.round(audio_removed * max_value), -max_value, max_value - 1
+    ).astype(f"<i{audio.sample_width}")
+    return audio._spawn(pcm.tobytes())
+
+
+def remove_specified_words(audio, words, removal_type: str = "nothing"):
+    """
+    Remove the words from audio, by replacing them with:
+    - nothing
+    - silence
+    - white noise
+    - pink noise
+
+    The words are removed in one pass on the waveform (see remove_words_from_waveform).
+
+    Args:
+        audio (pydub.AudioSegment): audio
+        words: words to remove with their start and end times
+        removal_type (str, optional): type of removal. Defaults to "nothing".
+    """
+    return _remove_words_from_segment(audio, words, removal_type)
 
 
 def transcribe_audio(
@@ -61,10 +213,39 @@ def transcribe_audio(
     """
     Transcribe audio using whisperx,
     and return the text (transcription) and the words with their start and end times.
+    The transcripts are cached on disk by audio content (see transcript_store).
     """
 
-    ## Load whisperx model
-    model_whisperx = whisperx.load_model(
+    ## Transcript already computed for the same audio (e.g., by another explainer)
+    transcript_store = get_transcript_store()
+    if transcript_store is not None:
+        audio_hash = get_file_hash(audio_path)
+        asr_model = f"{model_name_whisper}/{compute_type}"
+        transcript = transcript_store.get(audio_hash, asr_model, language)
+        if transcript is not None:
+            return transcript
+
+    text, words = _transcribe_audio(
+        audio_path, device, batch_size, compute_type, language, model_name_whisper
+    )
+
+    if transcript_store is not None:
+        transcript_store.put(audio_hash, asr_model, language, text, words)
+    return text, words
+
+
+def _transcribe_audio(
+    audio_path: str,
+    device: str,
+    batch_size: int,
+    compute_type: str,
+    language: str,
+    model_name_whisper: str,
+) -> Tuple[str, List[Dict[str, Union[str, float]]]]:
+    import whisperx
+
+    ## Load whisperx model (once per process, see whisperx_registry)
+    model_whisperx = WHISPERX_MODELS.get_model(
         model_name_whisper,
         device,
         compute_type=compute_type,
@@ -74,8 +255,8 @@ def transcribe_audio(
     ## Transcribe audio
     audio = whisperx.load_audio(audio_path)
     result = model_whisperx.transcribe(audio, batch_size=batch_size)
-    model_a, metadata = whisperx.load_align_model(
-        language_code=result["language"], device=device
+    model_a, metadata = WHISPERX_MODELS.get_align_model(
+        language=result["language"], device=device
     )
 
     ## Align timestamps
@@ -88,6 +269,12 @@ def transcribe_audio(
         return_char_alignments=False,
     )
 
+    return _words_from_aligned_result(result)
+
+
+def _words_from_aligned_result(
+    result,
+) -> Tuple[str, List[Dict[str, Union[str, float]]]]:
     if result is None or "segments" not in result or len(result["segments"]) == 0:
         return "", []
 
@@ -105,6 +292,155 @@ def transcribe_audio(
     return text, words
 
 
+def transcribe_audios(
+    audio_paths,
+    device: str = "cuda",
+    batch_size: int = 16,
+    compute_type: str = "float32",
+    language: str = "en",
+    model_name_whisper: str = "large-v2",
+    path_column: str = "path",
+    n_loading_threads: int = 4,
+) -> List[Tuple[str, List[Dict[str, Union[str, float]]]]]:
+    """
+    Transcribe and align a list of audios (e.g., a whole dataset) using whisperx,
+    and return the text (transcription) and the words with their start and end times of each audio, as transcribe_audio.
+    The whisperx and alignment models are loaded once, and the results are written in the transcript store (see transcript_store),
+    so that the explainers and evaluators do not transcribe the audios again.
+
+    Audios shorter than 30 s (a single whisper window, e.g., FSC utterances) are transcribed together in batches of batch_size,
+    as a single segment. Longer audios are transcribed one at a time, in batches of their voice activity segments.
+
+    Args:
+        audio_paths: list of audio paths, or a datasets.Dataset with the paths in path_column (see utils.load_dataset_and_model)
+        n_loading_threads: number of threads that load the audios while the previous ones are transcribed
+    """
+    import whisperx
+
+    if hasattr(audio_paths, "column_names"):
+        audio_paths = audio_paths[path_column]
+    audio_paths = list(audio_paths)
+
+    transcripts = [None] * len(audio_paths)
+    asr_model = f"{model_name_whisper}/{compute_type}"
+    transcript_store = get_transcript_store()
+    audio_hashes = [None] * len(audio_paths)
+    if transcript_store is not None:
+        for e, audio_path in enumerate(audio_paths):
+            audio_hashes[e] = get_file_hash(audio_path)
+            transcripts[e] = transcript_store.get(audio_hashes[e], asr_model, language)
+
+    missing_idxs = [e for e, transcript in enumerate(transcripts) if transcript is None]
+    if len(missing_idxs) == 0:
+        return transcripts
+
+    model_whisperx = WHISPERX_MODELS.get_model(
+        model_name_whisper,
+        device,
+        compute_type=compute_type,
+        language=language,
+    )
+    model_a, metadata = WHISPERX_MODELS.get_align_model(
+        language=language, device=device
+    )
+
+    def align(e, audio, segments):
+        result = whisperx.align(
+            segments,
+            model_a,
+            metadata,
+            audio,
+            device,
+            return_char_alignments=False,
+        )
+        transcripts[e] = _words_from_aligned_result(result)
+        if transcript_store is not None:
+            transcript_store.put(audio_hashes[e], asr_model, language, *transcripts[e])
+
+    with ThreadPoolExecutor(n_loading_threads) as executor:
+        # The audios are loaded in order, at most 2 * n_loading_threads ahead of the transcription
+        audios = _load_ahead(
+            executor,
+            lambda e: whisperx.load_audio(audio_paths[e]),
+            missing_idxs,
+            2 * n_loading_threads,
+        )
+
+        batch = []
+        for e, audio in zip(missing_idxs, audios):
+            if len(audio) > WHISPER_CHUNK_SAMPLES:
+                result = model_whisperx.transcribe(audio, batch_size=batch_size)
+                align(e, audio, result["segments"])
+                continue
+
+            batch.append((e, audio))
+            if len(batch) == batch_size:
+                _transcribe_batch(model_whisperx, batch, batch_size, align)
+                batch = []
+        if batch:
+            _transcribe_batch(model_whisperx, batch, batch_size, align)
+    return transcripts
+
+
+def _load_ahead(executor, load, items, window: int):
+    """
+    Yields load(item) for the items in order, with at most window loads submitted ahead of the consumer,
+    so that the loaded audios waiting for the transcription are bounded
+    """
+    pending = deque()
+    items = iter(items)
+    for item in items:
+        pending.append(executor.submit(load, item))
+        if len(pending) >= window:
+            break
+    while pending:
+        result = pending.popleft().result()
+        for item in items:
+            pending.append(executor.submit(load, item))
+            break
+        yield result
+
+
+def _transcribe_batch(model_whisperx, batch, batch_size: int, align):
+    """
+    Transcribe a batch of short audios, each as a single segment, with the batched pipeline of whisperx
+    """
+    outputs = model_whisperx(
+        [{"inputs": audio} for _, audio in batch], batch_size=batch_size
+    )
+    for (e, audio), output in zip(batch, outputs):
+        text = output["text"]
+        # The pipeline unbatches the outputs only if batch_size > 1 (as in whisperx FasterWhisperPipeline.transcribe)
+        if batch_size in [0, 1, None]:
+            text = text[0]
+        segments = [
+            {
+                "text": text,
+                "start": 0.0,
+                "end": round(len(audio) / WHISPER_SAMPLE_RATE, 3),
+            }
+        ]
+        align(e, audio, segments)
+
+
+def preload_whisperx_models(
+    device: str = "cuda",
+    compute_type: str = "float32",
+    language: str = "en",
+    model_name_whisper: str = "large-v2",
+    max_bytes: int = None,
+):
+    """
+    Load the whisperx model and the alignment model used by transcribe_audio in advance (e.g., at startup).
+
+    Args:
+        max_bytes: if set, memory budget of the whisperx models of the process. The least recently used are evicted
+    """
+    if max_bytes is not None:
+        WHISPERX_MODELS.max_bytes = max_bytes
+    WHISPERX_MODELS.preload(model_name_whisper, device, compute_type, language)
+
+
 def transcribe_audio_given_model(
     model_whisperx,
     audio_path: str,
@@ -115,12 +451,13 @@ def transcribe_audio_given_model(
     Transcribe audio using whisperx,
     and return the text (transcription) and the words with their start and end times.
     """
+    import whisperx
 
     ## Transcribe audio
     audio = whisperx.load_audio(audio_path)
     result = model_whisperx.transcribe(audio, batch_size=batch_size)
-    model_a, metadata = whisperx.load_align_model(
-        language_code=result["language"], device=device
+    model_a, metadata = WHISPERX_MODELS.get_align_model(
+        language=result["language"], device=device
     )
 
     ## Align timestamps
@@ -133,26 +470,12 @@ def transcribe_audio_given_model(
         return_char_alignments=False,
     )
 
-    if result is None or "segments" not in result or len(result["segments"]) == 0:
-        return "", []
-
-    if len(result["segments"]) == 1:
-        text = result["segments"][0]["text"]
-        words = result["segments"][0]["words"]
-    else:
-        text = " ".join(
-            result["segments"][i]["text"] for i in range(len(result["segments"]))
-        )
-        words = [word for segment in result["segments"] for word in segment["words"]]
-
-    # Remove words that are not properly transcribed
-    words = [word for word in words if "start" in word]
-    return text, words
+    return _words_from_aligned_result(result)
 
 
 def remove_word(audio, word, removal_type: str = "nothing"):
     """
-    Remove a word from audio using pydub, by replacing it with:
+    Remove a word from audio, by replacing it with:
     - nothing
     - silence
     - white noise
@@ -163,26 +486,4 @@ def remove_word(audio, word, removal_type: str = "nothing"):
         word: word to remove with its start and end times
         removal_type (str, optional): type of removal. Defaults to "nothing".
     """
-
-    a, b = 100, 40
-
-    before_word_audio = audio[: word["start"] * 1000 - a]
-    after_word_audio = audio[word["end"] * 1000 + b :]
-    word_duration = (word["end"] * 1000 - word["start"] * 1000) + a + b
-
-    if removal_type == "nothing":
-        replace_word_audio = AudioSegment.empty()
-    elif removal_type == "silence":
-        replace_word_audio = AudioSegment.silent(duration=word_duration)
-
-    elif removal_type == "white noise":
-        sound_path = (os.path.join(os.path.dirname(__file__), "white_noise.mp3"),)
-        replace_word_audio = AudioSegment.from_mp3(sound_path)[:word_duration]
-
-        # display(audio_removed)
-    elif removal_type == "pink noise":
-        sound_path = (os.path.join(os.path.dirname(__file__), "pink_noise.mp3"),)
-        replace_word_audio = AudioSegment.from_mp3(sound_path)[:word_duration]
-
-    audio_removed = before_word_audio + replace_word_audio + after_word_audio
-    return audio_removed
+    return _remove_words_from_segment(audio, [word], removal_type)
@@ -0,0 +1,172 @@
+"""Process-wide registry of the WhisperX models"""
+import gc
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import torch
+
+# Number of parameters of the whisper models, to estimate their memory
+WHISPER_N_PARAMS = {
+    "tiny": 39e6,
+    "base": 74e6,
+    "small": 244e6,
+    "medium": 769e6,
+    "large": 1550e6,
+}
+
+# Bytes per parameter of the compute types of faster-whisper (CTranslate2)
+COMPUTE_TYPE_BYTES = {
+    "float32": 4,
+    "float16": 2,
+    "bfloat16": 2,
+    "int8_float32": 1,
+    "int8_float16": 1,
+    "int8_bfloat16": 1,
+    "int8": 1,
+}
+
+
+def _whisper_model_bytes(model_name: str, compute_type: str) -> int:
+    # E.g., "large-v2", "medium.en", "distil-large-v2"
+    size = next((size for size in WHISPER_N_PARAMS if size in model_name), "large")
+    return int(WHISPER_N_PARAMS[size] * COMPUTE_TYPE_BYTES.get(compute_type, 4))
+
+
+def _module_bytes(model) -> int:
+    if not isinstance(model, torch.nn.Module):
+        return 0
+    return sum(
+        tensor.numel() * tensor.element_size()
+        for tensor in list(model.parameters()) + list(model.buffers())
+    )
+
+
+class WhisperXModelRegistry:
+    """
+    Loads each WhisperX model once, for each (model name, device, compute type, language),
+    and each alignment model once, for each (language, device, alignment model name), and reuses them across calls.
+    If max_bytes is set, the least recently used models are evicted when their (estimated) memory exceeds it.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        """
+        Args:
+            max_bytes: memory budget of the loaded models. If None, the models are never evicted
+        """
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def _get(self, key: Hashable, load_function, n_bytes_function):
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return self._models[key][0]
+
+            model = load_function()
+            n_bytes = n_bytes_function(model)
+            self._models[key] = (model, n_bytes)
+            self.n_bytes += n_bytes
+            self.loads += 1
+            self._evict(keep=key)
+            return model
+
+    def _evict(self, keep: Hashable = None):
+        if self.max_bytes is None:
+            return
+        evicted = False
+        # The model just loaded is never evicted, even if it exceeds the budget alone
+        while self.n_bytes > self.max_bytes and len(self._models) > 1:
+            key = next(iter(self._models))
+            if key == keep:
+                break
+            _, n_bytes = self._models.pop(key)
+            self.n_bytes -= n_bytes
+            self.evictions += 1
+            evicted = True
+        if evicted:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def get_model(
+        self,
+        model_name: str = "large-v2",
+        device: str = "cuda",
+        compute_type: str = "float32",
+        language: str = "en",
+    ):
+        """
+        WhisperX model (whisperx.load_model)
+        """
+        import whisperx
+
+        return self._get(
+            ("asr", model_name, device, compute_type, language),
+            lambda: whisperx.load_model(
+                model_name, device, compute_type=compute_type, language=language
+            ),
+            lambda model: _whisper_model_bytes(model_name, compute_type),
+        )
+
+    def get_align_model(
+        self, language: str = "en", device: str = "cuda", model_name: str = None
+    ):
+        """
+        Alignment model and its metadata (whisperx.load_align_model)
+        """
+        import whisperx
+
+        return self._get(
+            ("align", language, device, model_name),
+            lambda: whisperx.load_align_model(
+                language_code=language, device=device, model_name=model_name
+            ),
+            lambda model: _module_bytes(model[0]),
+        )
+
+    def preload(
+        self,
+        model_name: str = "large-v2",
+        device: str = "cuda",
+        compute_type: str = "float32",
+        language: str = "en",
+        align: bool = True,
+    ):
+        """
+        Load the WhisperX model (and the alignment model of the language) in advance, e.g., at startup
+        """
+        self.get_model(model_name, device, compute_type, language)
+        if align:
+            self.get_align_model(language, device)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self.n_bytes = 0
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "loads": self.loads,
+            "hits": self.hits,
+            "evictions": self.evictions,
+            "models": len(self._models),
+            "bytes": self.n_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Registry used by utils_removal.transcribe_audio
+WHISPERX_MODELS = WhisperXModelRegistry()
@@ -0,0 +1,231 @@
+"""Incremental recomputation of the wav2vec2 feature encoder for span-local perturbations"""
+import threading
+import numpy as np
+import torch
+from typing import List, Tuple
+from speechxai.model_helpers.utils_inference import (
+    forward_logits,
+    get_audio_hash,
+    get_inference_device,
+    get_inference_model,
+)
+
+# The feature encoder of the model is temporarily replaced by the precomputed features
+_SWAP_LOCK = threading.Lock()
+
+
+class _PrecomputedFeatures(torch.nn.Module):
+    def __init__(self, features: torch.Tensor):
+        super().__init__()
+        self.features = features
+
+    def forward(self, input_values):
+        return self.features
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]], gap: int = 0) -> List[Tuple[int, int]]:
+    """
+    Merge the [start, end) ranges that overlap or are at most gap apart.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class IncrementalFeatureEncoder:
+    """
+    Caches the output of each conv layer of the wav2vec2 feature encoder for a reference (original) audio.
+    An audio of the same length that differs from the reference only in some spans (e.g., words replaced by silence or noise)
+    is encoded by recomputing only the frames in the receptive field of the changed samples. The transformer then runs on the full features.
+
+    The recomputation is exact if the feature extractor does not normalize the audio and the conv layers do not use group norm (feat_extract_norm="layer").
+    Otherwise (e.g., the wav2vec2-base superb models), both normalizations depend on the whole audio: with approximate=True,
+    we reuse the normalization statistics of the reference audio. Use utils_inference.check_incremental_predict to measure the drift.
+    """
+
+    def __init__(self, model_helper, reference_audio: np.ndarray, approximate=False):
+        self.model_helper = model_helper
+        self.conv_layers = list(
+            model_helper.model.base_model.feature_extractor.conv_layers
+        )
+        self.do_normalize = bool(
+            getattr(model_helper.feature_extractor, "do_normalize", False)
+        )
+        self.approximate = approximate
+
+        if not self.is_exact and not approximate:
+            raise ValueError(
+                "The incremental feature encoder is not exact for models with group norm in the feature encoder or with input normalization (do_normalize). Use approximate=True"
+            )
+
+        self.reference_audio = np.asarray(reference_audio.squeeze(), dtype=np.float32)
+        self.reference_hash = get_audio_hash(self.reference_audio)
+        self.n_samples = self.reference_audio.shape[-1]
+
+        # Normalization of the feature extractor (zero mean and unit variance)
+        if self.do_normalize:
+            self.mean = float(self.reference_audio.mean())
+            self.std = float(np.sqrt(self.reference_audio.var() + 1e-7))
+        else:
+            self.mean, self.std = 0.0, 1.0
+
+        # Changed samples closer than the receptive field of the feature encoder are recomputed together
+        self.receptive_field, jump = 1, 1
+        for layer in self.conv_layers:
+            self.receptive_field += (layer.conv.kernel_size[0] - 1) * jump
+            jump *= layer.conv.stride[0]
+
+        inputs = model_helper._extract_features([self.reference_audio])
+        self.reference_input_values = inputs.input_values.to(model_helper.device)
+        with torch.no_grad():
+            self._encode_reference()
+
+    @property
+    def is_exact(self) -> bool:
+        return not self.do_normalize and not any(
+            isinstance(getattr(layer, "layer_norm", None), torch.nn.GroupNorm)
+            for layer in self.conv_layers
+        )
+
+    def is_applicable(self, audio: np.ndarray) -> bool:
+        """
+        Only audios with the same length of the reference audio (e.g., not the removal type "nothing")
+        """
+        return audio.squeeze().shape == self.reference_audio.shape
+
+    def _encode_reference(self):
+        hidden_states = self.reference_input_values[:, None]
+        self.reference_outputs = []
+        self.group_norm_stats = []
+        for layer in self.conv_layers:
+            if isinstance(getattr(layer, "layer_norm", None), torch.nn.GroupNorm):
+                # One group per channel: the statistics are computed over the whole audio
+                conv_states = layer.conv(hidden_states)
+                stats = (
+                    conv_states.mean(-1, keepdim=True),
+                    conv_states.var(-1, unbiased=False, keepdim=True),
+                )
+                hidden_states = self._group_norm_layer(layer, conv_states, stats)
+            else:
+                stats = None
+                hidden_states = layer(hidden_states)
+            self.group_norm_stats.append(stats)
+            self.reference_outputs.append(hidden_states)
+
+    def _group_norm_layer(self, layer, conv_states, stats):
+        mean, var = stats
+        norm = layer.layer_norm
+        hidden_states = (conv_states - mean) / torch.sqrt(var + norm.eps)
+        hidden_states = hidden_states * norm.weight[:, None] + norm.bias[:, None]
+        return layer.activation(hidden_states)
+
+    def _apply_layer(self, layer_idx: int, window: torch.Tensor) -> torch.Tensor:
+        layer = self.conv_layers[layer_idx]
+        stats = self.group_norm_stats[layer_idx]
+        if stats is None:
+            return layer(window)
+        # Approximation: normalization with the statistics of the reference audio
+        return self._group_norm_layer(layer, layer.conv(window), stats)
+
+    def _window(self, reference_states, patches, start: int, end: int):
+        """
+        Slice [start, end) of the (reference) hidden states, with the recomputed patches applied.
+        """
+        window = reference_states[:, :, start:end].clone()
+        for patch_start, patch in patches:
+            patch_end = patch_start + patch.shape[-1]
+            overlap_start, overlap_end = max(start, patch_start), min(end, patch_end)
+            if overlap_start < overlap_end:
+                window[:, :, overlap_start - start : overlap_end - start] = patch[
+                    :, :, overlap_start - patch_start : overlap_end - patch_start
+                ]
+        return window
+
+    def changed_ranges(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        """
+        [start, end) sample ranges in which the audio differs from the reference audio.
+        """
+        changed = np.flatnonzero(audio != self.reference_audio)
+        if len(changed) == 0:
+            return []
+        breaks = np.flatnonzero(np.diff(changed) > 1)
+        starts = np.concatenate([[changed[0]], changed[breaks + 1]])
+        ends = np.concatenate([changed[breaks], [changed[-1]]]) + 1
+        return _merge_ranges(
+            list(zip(starts.tolist(), ends.tolist())), gap=self.receptive_field
+        )
+
+    def encode(self, audio: np.ndarray) -> torch.Tensor:
+        """
+        Output of the feature encoder for the audio, of shape (1, conv_dim, n_frames).
+        """
+        audio = np.asarray(audio.squeeze(), dtype=np.float32)
+        ranges = self.changed_ranges(audio)
+
+        reference_states = self.reference_input_values[:, None]
+        patches = [
+            (
+                start,
+                torch.from_numpy((audio[start:end] - self.mean) / self.std)
+                .to(reference_states)
+                .reshape(1, 1, -1),
+            )
+            for start, end in ranges
+        ]
+
+        with torch.no_grad():
+            for layer_idx, layer in enumerate(self.conv_layers):
+                kernel_size, stride = layer.conv.kernel_size[0], layer.conv.stride[0]
+                n_frames = self.reference_outputs[layer_idx].shape[-1]
+
+                # Output frames whose receptive field overlaps a changed range
+                ranges = _merge_ranges(
+                    [
+                        (
+                            max(0, (start - kernel_size) // stride + 1),
+                            min(n_frames, (end - 1) // stride + 1),
+                        )
+                        for start, end in ranges
+                    ]
+                )
+                ranges = [(start, end) for start, end in ranges if start < end]
+
+                patches_layer = []
+                for start, end in ranges:
+                    window = self._window(
+                        reference_states,
+                        patches,
+                        start * stride,
+                        (end - 1) * stride + kernel_size,
+                    )
+                    patches_layer.append((start, self._apply_layer(layer_idx, window)))
+
+                reference_states = self.reference_outputs[layer_idx]
+                patches = patches_layer
+
+            return self._window(
+                reference_states, patches, 0, reference_states.shape[-1]
+            )
+
+    def predict_logits(self, audios: List[np.ndarray]) -> np.ndarray:
+        """
+        Predicts the logits of a batch of audios with the same length of the reference audio.
+        """
+        device = get_inference_device(self.model_helper)
+        features = torch.cat([self.encode(audio) for audio in audios]).to(device)
+        input_values = self.reference_input_values.expand(len(audios), -1)
+
+        # The conv layers are not quantized, the features are the same for all precisions
+        base_model = get_inference_model(self.model_helper).base_model
+        with _SWAP_LOCK:
+            feature_encoder = base_model.feature_extractor
+            base_model.feature_extractor = _PrecomputedFeatures(features)
+            try:
+                # The compiled model would be recompiled for the swapped feature encoder
+                return forward_logits(self.model_helper, input_values, compiled=False)
+            finally:
+                base_model.feature_extractor = feature_encoder
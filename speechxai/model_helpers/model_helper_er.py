@@ -1,8 +1,15 @@
 import numpy as np
 from typing import Dict, List, Union, Tuple
 import torch
-from speechxai.utils import pydub_to_np
-from pydub import AudioSegment
+from speechxai.audio_io import load_audio
+from speechxai.model_helpers.prediction_cache import PredictionCache
+from speechxai.model_helpers.utils_inference import (
+    COMPILE_BUCKET_DURATIONS,
+    MAX_BATCH_SAMPLES,
+    check_precision,
+    predict_logits,
+    forward_logits,
+)
 
 
 class ModelHelperER:
@@ -10,13 +17,47 @@ class ModelHelperER:
     Wrapper class to interface with HuggingFace models
     """
 
-    def __init__(self, model, feature_extractor, device, language="en"):
+    def __init__(
+        self,
+        model,
+        feature_extractor,
+        device,
+        language="en",
+        batch_inference: bool = False,
+        max_batch_samples: int = MAX_BATCH_SAMPLES,
+        pad_tolerance: float = 0.1,
+        cache: PredictionCache = None,
+        incremental_encoding: bool = False,
+        incremental_approximate: bool = False,
+        precision: str = "fp32",
+        compile_inference: bool = False,
+        compile_durations: Tuple[float, ...] = COMPILE_BUCKET_DURATIONS,
+    ):
         self.model = model
         self.feature_extractor = feature_extractor
         self.device = device
         self.n_labels = 1  # Single label problem
         self.language = language
         self.label_name = "class"
+        # If True, audios of similar length are predicted together (see utils_inference.predict_logits)
+        self.batch_inference = batch_inference
+        self.max_batch_samples = max_batch_samples
+        self.pad_tolerance = pad_tolerance
+        # Optional cache of the predictions, it can be shared across model helpers
+        self.cache = cache
+        # If True, within utils_inference.incremental_reference only the feature encoder frames affected by a perturbation are recomputed
+        # incremental_approximate is required if the feature encoder is not span-local (see IncrementalFeatureEncoder)
+        self.incremental_encoding = incremental_encoding
+        self.incremental_approximate = incremental_approximate
+        self.incremental_encoder = None
+        # Precision of predict: "fp32", "int8" (dynamic quantization) or "bf16" (autocast). Gradients are always in fp32
+        # The drift from fp32 can be measured with utils_inference.check_precision_predict
+        check_precision(precision)
+        self.precision = precision
+        # If True, predict uses the torch.compile'd model, with the inputs padded to compile_durations if padding does not change the prediction
+        # Use utils_inference.warmup_compiled_model to compile it in advance
+        self.compile_inference = compile_inference
+        self.compile_durations = compile_durations
 
     # PREDICT SINGLE
     def predict(
@@ -24,15 +65,14 @@ class ModelHelperER:
         audios: List[np.ndarray],
     ) -> np.ndarray:
         """
-        Predicts action, object and location from audio one sample at a time.
+        Predicts emotion from audio.
         Returns probs for each class.
-        # We do separately for consistency with FSC/IC model and the bug of padding
+        # By default, we predict one sample at a time for consistency with FSC/IC model and the bug of padding
+        # With batch_inference, audios of similar length are batched together
         """
 
-        probs = np.empty((len(audios), self.model.config.num_labels))
-        for e, audio in enumerate(audios):
-            probs[e] = self._predict([audio])
-        return probs
+        logits = predict_logits(self, audios)
+        return self._logits_to_probs(torch.from_numpy(logits))
 
     def _predict(
         self,
@@ -42,25 +82,35 @@ class ModelHelperER:
         Predicts emotion from audio.
         Returns probs for each class.
         """
+        logits = torch.from_numpy(self._predict_logits(audios))
+        return self._logits_to_probs(logits)
+
+    def _predict_logits(
+        self,
+        audios: List[np.ndarray],
+    ) -> np.ndarray:
+        """
+        Predicts the logits of a batch of audios.
+        """
+
+        ## Extract features
+        inputs = self._extract_features(audios)
 
-        ## Extract features
-        inputs = self.feature_extractor(
+        ## Predict logits
+        # The attention mask is returned only by the feature extractors of models that support padding
+        return forward_logits(
+            self, inputs.input_values, inputs.get("attention_mask", None)
+        )
+
+    def _extract_features(self, audios: List[np.ndarray]):
+        return self.feature_extractor(
             [audio.squeeze() for audio in audios],
             sampling_rate=self.feature_extractor.sampling_rate,
             padding=True,
             return_tensors="pt",
         )
 
-        ## Predict logits
-        with torch.no_grad():
-            logits = (
-                self.model(inputs.input_values.to(self.device))
-                .logits.detach()
-                .cpu()
-                # .numpy()
-            )
-            logits = logits
-
+    def _logits_to_probs(self, logits: torch.Tensor) -> np.ndarray:
         return logits.softmax(-1).numpy()
 
     def get_text_labels(self, targets) -> str:
@@ -82,7 +132,7 @@ class ModelHelperER:
             raise ValueError("Specify the audio path or the audio as a numpy array")
 
         if audio is None:
-            audio = pydub_to_np(AudioSegment.from_wav(audio_path))[0]
+            audio = load_audio(audio_path).samples
 
         logits = self.predict([audio])
         predicted_ids = np.argmax(logits, axis=1)[0]
@@ -93,7 +143,7 @@ class ModelHelperER:
             raise ValueError("Specify the audio path or the audio as a numpy array")
 
         if audio is None:
-            audio = pydub_to_np(AudioSegment.from_wav(audio_path))[0]
+            audio = load_audio(audio_path).samples
 
         logits = self.predict([audio])
         predicted_id = np.argmax(logits, axis=1)[0]
@@ -1,8 +1,16 @@
 import numpy as np
 from typing import Dict, List, Union, Tuple
 import torch
-from speechxai.utils import pydub_to_np
-from pydub import AudioSegment
+from speechxai.audio_io import load_audio
+from speechxai.model_helpers.prediction_cache import PredictionCache
+from speechxai.model_helpers.utils_inference import (
+    COMPILE_BUCKET_DURATIONS,
+    MAX_BATCH_SAMPLES,
+    check_precision,
+    predict_logits,
+    forward_logits,
+    get_label_prediction_function,
+)
 
 
 class ModelHelperFSC:
@@ -10,13 +18,49 @@ class ModelHelperFSC:
     Wrapper class to interface with HuggingFace models
     """
 
-    def __init__(self, model, feature_extractor, device, language="en"):
+    def __init__(
+        self,
+        model,
+        feature_extractor,
+        device,
+        language="en",
+        batch_inference: bool = False,
+        max_batch_samples: int = MAX_BATCH_SAMPLES,
+        pad_tolerance: float = 0.1,
+        cache: PredictionCache = None,
+        incremental_encoding: bool = False,
+        incremental_approximate: bool = False,
+        precision: str = "fp32",
+        compile_inference: bool = False,
+        compile_durations: Tuple[float, ...] = COMPILE_BUCKET_DURATIONS,
+    ):
         self.model = model
         self.feature_extractor = feature_extractor
         self.device = device
         self.n_labels = 3  # Multi label problem
         self.language = language
         self.label_name = ["action", "object", "location"]
+        # If True, audios of similar length are predicted together (see utils_inference.predict_logits)
+        self.batch_inference = batch_inference
+        self.max_batch_samples = max_batch_samples
+        self.pad_tolerance = pad_tolerance
+        # Optional cache of the predictions, it can be shared across model helpers
+        self.cache = cache
+        # If True, within utils_inference.incremental_reference only the feature encoder frames affected by a perturbation are recomputed
+        # incremental_approximate is required if the feature encoder is not span-local (see IncrementalFeatureEncoder)
+        self.incremental_encoding = incremental_encoding
+        self.incremental_approximate = incremental_approximate
+        self.incremental_encoder = None
+        # Precision of predict: "fp32", "int8" (dynamic quantization) or "bf16" (autocast). Gradients are always in fp32
+        # The drift from fp32 can be measured with utils_inference.check_precision_predict
+        check_precision(precision)
+        self.precision = precision
+        # If True, predict uses the torch.compile'd model, with the inputs padded to compile_durations if padding does not change the prediction
+        # Use utils_inference.warmup_compiled_model to compile it in advance
+        self.compile_inference = compile_inference
+        self.compile_durations = compile_durations
+        # Last multi-label prediction, reused by the prediction functions by label (see utils_inference.get_label_prediction_function)
+        self._last_prediction = None
 
     # PREDICT SINGLE
     def predict(
@@ -24,54 +68,38 @@ class ModelHelperFSC:
         audios: List[np.ndarray],
     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
-        Predicts action, object and location from audio one sample at a time.
+        Predicts action, object and location from audio.
         Returns probs for each class.
-        # This is to fix the bug of padding
+        # By default, we predict one sample at a time. This is to fix the bug of padding
+        # With batch_inference, only audios of the same length are batched together (the model does not use the attention mask)
         """
 
-        action_probs = np.empty((len(audios), 6))
-        object_probs = np.empty((len(audios), 14))
-        location_probs = np.empty((len(audios), 4))
-        for e, audio in enumerate(audios):
-            action_probs[e], object_probs[e], location_probs[e] = self._predict([audio])
-        return action_probs, object_probs, location_probs
+        logits = predict_logits(self, audios)
+        return self._logits_to_probs(torch.from_numpy(logits))
 
     def predict_action(
         self,
         audios: List[np.ndarray],
     ):
-        action_probs = np.empty((len(audios), 6))
-        for e, audio in enumerate(audios):
-            action_probs[e], _, _ = self._predict([audio])
-        return action_probs
+        return self.predict(audios)[0]
 
     def predict_object(
         self,
         audios: List[np.ndarray],
     ):
-        object_probs = np.empty((len(audios), 14))
-        for e, audio in enumerate(audios):
-            _, object_probs[e], _ = self._predict([audio])
-        return object_probs
+        return self.predict(audios)[1]
 
     def predict_location(
         self,
         audios: List[np.ndarray],
     ):
-        location_probs = np.empty((len(audios), 4))
-        for e, audio in enumerate(audios):
-            _, _, location_probs[e] = self._predict([audio])
-        return location_probs
+        return self.predict(audios)[2]
 
     def get_prediction_function_by_label(self, label):
-        if label == 0:
-            return self.predict_action
-        elif label == 1:
-            return self.predict_object
-        elif label == 2:
-            return self.predict_location
-        else:
+        if label not in [0, 1, 2]:
             raise ValueError("label should be 0, 1 or 2")
+        # A single forward pass predicts the three labels, reused by the functions of the other labels on the same audios
+        return get_label_prediction_function(self, label)
 
     def _predict(
         self,
@@ -81,26 +109,40 @@ class ModelHelperFSC:
         Predicts action, object and location from audio.
         Returns probs for each class.
         """
+        logits = torch.from_numpy(self._predict_logits(audios))
+        return self._logits_to_probs(logits)
+
+    def _predict_logits(
+        self,
+        audios: List[np.ndarray],
+    ) -> np.ndarray:
+        """
+        Predicts the logits of a batch of audios, for action, object and location.
+        """
 
-        ## Extract features
-        inputs = self.feature_extractor(
+        ## Extract features
+        inputs = self._extract_features(audios)
+
+        ## Predict logits
+        # The attention mask is returned only by the feature extractors of models that support padding
+        return forward_logits(
+            self, inputs.input_values, inputs.get("attention_mask", None)
+        )
+
+    def _extract_features(self, audios: List[np.ndarray]):
+        return self.feature_extractor(
             [audio.squeeze() for audio in audios],
             sampling_rate=self.feature_extractor.sampling_rate,
             padding=True,
             return_tensors="pt",
         )
 
-        ## Predict logits
-        with torch.no_grad():
-            logits = (
-                self.model(inputs.input_values.to(self.device))
-                .logits.detach()
-                .cpu()
-                # .numpy()
-            )
-            action_logits = logits[:, :6]
-            object_logits = logits[:, 6:20]
-            location_logits = logits[:, 20:24]
+    def _logits_to_probs(
+        self, logits: torch.Tensor
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        action_logits = logits[:, :6]
+        object_logits = logits[:, 6:20]
+        location_logits = logits[:, 20:24]
 
         return (
             action_logits.softmax(-1).numpy(),
@@ -157,7 +199,7 @@ class ModelHelperFSC:
             raise ValueError("Specify the audio path or the audio as a numpy array")
 
         if audio is None:
-            audio = pydub_to_np(AudioSegment.from_wav(audio_path))[0]
+            audio = load_audio(audio_path).samples
 
         logits_action, logits_object, logits_location = self.predict([audio])
         action_ind = np.argmax(logits_action, axis=1)[0]
@@ -170,7 +212,7 @@ class ModelHelperFSC:
             raise ValueError("Specify the audio path or the audio as a numpy array")
 
         if audio is None:
-            audio = pydub_to_np(AudioSegment.from_wav(audio_path))[0]
+            audio = load_audio(audio_path).samples
 
         logits_action, logits_object, logits_location = self.predict([audio])
         action_ind = np.argmax(logits_action, axis=1)[0]
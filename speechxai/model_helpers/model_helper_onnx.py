@@ -0,0 +1,125 @@
+"""ONNX Runtime inference backend for the model helpers"""
+import types
+import numpy as np
+import torch
+from typing import List
+from speechxai.model_helpers.utils_inference import supports_padding
+
+
+class _LogitsOnly(torch.nn.Module):
+    """
+    Wrapper of the HuggingFace model that returns only the logits, for the export.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_values, attention_mask=None):
+        return self.model(input_values, attention_mask=attention_mask).logits
+
+
+def export_onnx(model_helper, onnx_path: str, opset_version: int = 17):
+    """
+    Export the model of the model helper (ModelHelperER, ModelHelperFSC, ModelHelperITALIC) to ONNX,
+    with dynamic batch size and sequence length.
+    The attention mask is an input of the exported model only if the model supports padding (see utils_inference.supports_padding).
+
+    Args:
+        model_helper: model helper
+        onnx_path: path of the exported model
+        opset_version: ONNX opset version
+    """
+    model = _LogitsOnly(model_helper.model).eval()
+
+    # One second of audio. The sequence length is a dynamic axis
+    inputs = model_helper._extract_features(
+        [np.zeros(model_helper.feature_extractor.sampling_rate, dtype=np.float32)]
+    )
+    input_names = ["input_values"]
+    args = (inputs.input_values.to(model_helper.device),)
+    if supports_padding(model_helper):
+        input_names.append("attention_mask")
+        args += (inputs.attention_mask.to(model_helper.device),)
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            args,
+            onnx_path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+            dynamo=False,
+        )
+
+
+class ModelHelperONNX:
+    """
+    Drop-in replacement of a model helper (ModelHelperER, ModelHelperFSC, ModelHelperITALIC) that predicts with ONNX Runtime on CPU.
+    The model is exported with export_onnx. The feature extraction, the batching, the cache and the outputs are those of the wrapped model helper.
+
+    Only for the gradient-free explainers and evaluators (e.g., LOOSpeechExplainer, LIMESpeechExplainer, ParalinguisticSpeechExplainer, AOPC)
+    """
+
+    def __init__(self, model_helper, onnx_path: str, n_threads: int = None):
+        """
+        Args:
+            model_helper: model helper of the exported model
+            onnx_path: path of the model exported with export_onnx
+            n_threads: number of threads of ONNX Runtime. If None, ONNX Runtime default
+        """
+        import onnxruntime
+
+        self.model_helper = model_helper
+        self.onnx_path = onnx_path
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if n_threads is not None:
+            session_options.intra_op_num_threads = n_threads
+        self.session = onnxruntime.InferenceSession(
+            onnx_path, session_options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [
+            session_input.name for session_input in self.session.get_inputs()
+        ]
+
+        # The incremental encoder is not supported by ONNX Runtime
+        self.incremental_encoding = False
+        self.incremental_encoder = None
+        # The precision is the one of the exported model
+        self.precision = "fp32"
+        self.compile_inference = False
+        # Fingerprint of the model for the cache (see utils_inference.get_model_fingerprint)
+        self._model_fingerprint = None
+        # Last multi-label prediction, reused by the prediction functions by label (see utils_inference.get_label_prediction_function)
+        self._last_prediction = None
+
+    def __getattr__(self, name):
+        # Called only for the attributes not defined here
+        if name == "model_helper":
+            raise AttributeError(name)
+        # The methods of the model helper (e.g., predict, get_predicted_classes, get_prediction_function_by_label)
+        # are bound to this object, so that they predict with ONNX Runtime
+        method = getattr(type(self.model_helper), name, None)
+        if callable(method):
+            return types.MethodType(method, self)
+        return getattr(self.model_helper, name)
+
+    def _predict_logits(
+        self,
+        audios: List[np.ndarray],
+    ) -> np.ndarray:
+        """
+        Predicts the logits of a batch of audios with ONNX Runtime.
+        """
+        inputs = self.model_helper._extract_features(audios)
+        onnx_inputs = {name: inputs[name].numpy() for name in self.input_names}
+        return self.session.run(["logits"], onnx_inputs)[0]
@@ -0,0 +1,164 @@
+"""Process-pool inference backend for the model helpers"""
+import os
+import types
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from speechxai.model_helpers.utils_inference import (
+    predict_logits,
+    get_label_prediction_function,
+)
+
+# Model helper of the worker process, initialized by _init_worker
+_WORKER_MODEL_HELPER = None
+
+
+def _init_worker(
+    model_helper_class,
+    model_class,
+    model_config,
+    state_dict,
+    feature_extractor,
+    model_helper_args,
+    torch_threads,
+):
+    global _WORKER_MODEL_HELPER
+
+    torch.set_num_threads(torch_threads)
+    # The model is rebuilt from its weights: the parametrized modules (e.g., the weight norm of wav2vec2) cannot be pickled
+    model = model_class(model_config)
+    model.load_state_dict(state_dict)
+    model.eval()
+    _WORKER_MODEL_HELPER = model_helper_class(
+        model, feature_extractor, torch.device("cpu"), **model_helper_args
+    )
+
+
+def _worker_predict_logits(audios: List[np.ndarray]) -> np.ndarray:
+    # The cache is managed by the main process
+    return predict_logits(_WORKER_MODEL_HELPER, audios, use_cache=False)
+
+
+class ModelHelperPool:
+    """
+    Drop-in replacement of a model helper (ModelHelperER, ModelHelperFSC, ModelHelperITALIC) that shards the predictions
+    across a pool of CPU worker processes, each with its own model helper.
+    The explainers (e.g., LOOSpeechExplainer, LIMESpeechExplainer, ParalinguisticSpeechExplainer) can take it in place of the model helper.
+
+    All the other attributes (e.g., n_labels, the feature extractor) are those of the wrapped model helper.
+    Its other methods (e.g., get_text_labels, get_predicted_probs) are bound to the pool, so that they predict on the workers.
+    """
+
+    def __init__(
+        self,
+        model_helper,
+        n_workers: int = None,
+        torch_threads_per_worker: int = 1,
+        min_audios_per_worker: int = 4,
+    ):
+        """
+        Args:
+            model_helper: model helper to replicate in the workers
+            n_workers: number of worker processes. If None, one worker per torch_threads_per_worker cores
+            torch_threads_per_worker: number of torch threads of each worker
+            min_audios_per_worker: audios are sharded in chunks of at least this size
+        """
+        self.model_helper = model_helper
+        self.torch_threads_per_worker = torch_threads_per_worker
+        self.n_workers = (
+            n_workers
+            if n_workers is not None
+            else max(1, (os.cpu_count() or 1) // torch_threads_per_worker)
+        )
+        self.min_audios_per_worker = min_audios_per_worker
+        # The incremental encoder is not supported by the workers
+        self.incremental_encoding = False
+        self.incremental_encoder = None
+        # Last multi-label prediction, reused by the prediction functions by label (see utils_inference.get_label_prediction_function)
+        self._last_prediction = None
+
+        model = model_helper.model
+        state_dict = {
+            name: tensor.detach().cpu() for name, tensor in model.state_dict().items()
+        }
+
+        model_helper_args = {
+            "batch_inference": model_helper.batch_inference,
+            "max_batch_samples": model_helper.max_batch_samples,
+            "pad_tolerance": model_helper.pad_tolerance,
+            "precision": model_helper.precision,
+            "compile_inference": model_helper.compile_inference,
+            "compile_durations": model_helper.compile_durations,
+        }
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                type(model_helper),
+                type(model),
+                model.config,
+                state_dict,
+                model_helper.feature_extractor,
+                model_helper_args,
+                torch_threads_per_worker,
+            ),
+        )
+
+    def __getattr__(self, name):
+        # Called only for the attributes not defined by the pool
+        if name == "model_helper":
+            raise AttributeError(name)
+        # The methods of the model helper (e.g., get_predicted_probs, predict_action) are bound to the pool,
+        # so that their predictions run on the workers
+        method = getattr(type(self.model_helper), name, None)
+        if callable(method):
+            return types.MethodType(method, self)
+        return getattr(self.model_helper, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown()
+
+    def _predict_logits_sharded(self, audios: List[np.ndarray]) -> np.ndarray:
+        if len(audios) == 0:
+            return np.empty(
+                (0, self.model_helper.model.config.num_labels), dtype=np.float32
+            )
+
+        n_shards = max(
+            1, min(self.n_workers, len(audios) // self.min_audios_per_worker)
+        )
+        shards = np.array_split(np.arange(len(audios)), n_shards)
+        futures = [
+            self._executor.submit(
+                _worker_predict_logits,
+                [np.asarray(audios[e], dtype=np.float32) for e in shard],
+            )
+            for shard in shards
+        ]
+        return np.concatenate([future.result() for future in futures])
+
+    def predict(self, audios: List[np.ndarray]):
+        """
+        Predicts the audios on the pool of workers.
+        Returns probs for each class, as the predict of the wrapped model helper.
+        """
+        # The cache (if any) is the one of the wrapped model helper
+        logits = predict_logits(
+            self.model_helper,
+            audios,
+            predict_function=self._predict_logits_sharded,
+        )
+        return self.model_helper._logits_to_probs(torch.from_numpy(logits))
+
+    def get_prediction_function_by_label(self, label):
+        # Multilabel scenario as for FSC: a single prediction on the pool for all the labels
+        return get_label_prediction_function(self, label)
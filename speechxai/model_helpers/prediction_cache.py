@@ -0,0 +1,81 @@
+"""Cache of the predictions of the model helpers"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    LRU cache of the logits predicted for a waveform, bounded by a memory budget.
+    Keys are (model fingerprint, waveform hash), so the same cache can be shared by several model helpers (see utils_inference.predict_logits).
+    """
+
+    # Approximate memory of an entry besides its logits (key, array header and LRU bookkeeping)
+    ENTRY_OVERHEAD_BYTES = 256
+
+    def __init__(self, max_bytes: int = 64 * 2**20):
+        """
+        Args:
+            max_bytes: memory budget of the cache. The least recently used entries are evicted when it is exceeded
+        """
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _entry_bytes(self, logits: np.ndarray) -> int:
+        return logits.nbytes + self.ENTRY_OVERHEAD_BYTES
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        with self._lock:
+            logits = self._entries.get(key)
+            if logits is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return logits
+
+    def put(self, key: Hashable, logits: np.ndarray):
+        logits = np.array(logits, copy=True)
+        logits.flags.writeable = False
+        entry_bytes = self._entry_bytes(logits)
+        if entry_bytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.n_bytes -= self._entry_bytes(self._entries.pop(key))
+            self._entries[key] = logits
+            self.n_bytes += entry_bytes
+
+            # Evict the least recently used entries
+            while self.n_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.n_bytes -= self._entry_bytes(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.n_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        n_requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / n_requests if n_requests > 0 else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.n_bytes,
+            "max_bytes": self.max_bytes,
+        }
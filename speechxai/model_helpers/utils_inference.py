@@ -0,0 +1,561 @@
+"""Inference utilities shared by the model helpers"""
+import copy
+import hashlib
+import numpy as np
+import torch
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from typing import Callable, Dict, List, Tuple
+
+# Default budget of (padded) audio samples in a single forward pass, e.g., 16 audios of 10 s at 16 kHz
+MAX_BATCH_SAMPLES = 16 * 10 * 16000
+
+# Maximum absolute difference between the probabilities of the batched and the one-at-a-time prediction.
+# Audios are padded only if the model receives the attention mask, otherwise only audios of the same length are batched.
+BATCH_PREDICTION_ATOL = 1e-4
+
+# Precision of the forward pass of predict (see get_inference_model). The gradients are always computed in fp32
+# int8: dynamic quantization of the linear layers (CPU only). bf16: bfloat16 autocast
+PRECISIONS = ("fp32", "int8", "bf16")
+
+# Durations (in seconds) to which the inputs of the compiled model are padded (see get_compile_shape)
+COMPILE_BUCKET_DURATIONS = (1.0, 2.0, 3.0, 4.0, 6.0, 8.0, 10.0, 15.0, 20.0, 30.0)
+
+
+def get_length_buckets(
+    lengths: List[int],
+    max_batch_samples: int = MAX_BATCH_SAMPLES,
+    pad_tolerance: float = 0.0,
+) -> List[List[int]]:
+    """
+    Group the indexes of the inputs in buckets of similar length.
+
+    Args:
+        lengths: length (number of samples) of each input
+        max_batch_samples: maximum number of (padded) samples in a bucket
+        pad_tolerance: maximum padding of a bucket, relative to its shortest input. If 0, only inputs with the same length are grouped together
+    """
+    buckets = []
+    bucket, bucket_min_length = [], None
+    for idx in np.argsort(lengths, kind="stable"):
+        length = lengths[idx]
+        if bucket and (
+            length > bucket_min_length * (1 + pad_tolerance)
+            # The inputs are sorted by length, so the current one is the longest of the bucket
+            or length * (len(bucket) + 1) > max_batch_samples
+        ):
+            buckets.append(bucket)
+            bucket = []
+        if bucket == []:
+            bucket_min_length = length
+        bucket.append(int(idx))
+    if bucket:
+        buckets.append(bucket)
+    return buckets
+
+
+def get_audio_hash(audio: np.ndarray) -> str:
+    """
+    Fast hash of the content of a waveform (samples, shape and dtype).
+    """
+    audio = np.ascontiguousarray(audio.squeeze())
+    audio_hash = hashlib.blake2b(digest_size=16)
+    audio_hash.update(f"{audio.dtype}{audio.shape}".encode())
+    audio_hash.update(memoryview(audio).cast("B"))
+    return audio_hash.hexdigest()
+
+
+def get_audios_hash(audios: List[np.ndarray]) -> Tuple[str, ...]:
+    return tuple(get_audio_hash(audio) for audio in audios)
+
+
+def supports_padding(model_helper) -> bool:
+    """
+    Padding does not change the prediction only if the model receives the attention mask.
+    This is not the case for the wav2vec2-base models (e.g., superb), that do not use the attention mask - the bug of padding.
+    """
+    return bool(getattr(model_helper.feature_extractor, "return_attention_mask", False))
+
+
+def get_model_fingerprint(model_helper) -> str:
+    """
+    Fingerprint of the model helper: model weights, feature extractor and helper class.
+    It is computed once and stored in the model helper.
+    """
+    if getattr(model_helper, "_model_fingerprint", None) is not None:
+        return model_helper._model_fingerprint
+
+    fingerprint = hashlib.blake2b(digest_size=16)
+    fingerprint.update(type(model_helper).__name__.encode())
+    fingerprint.update(str(getattr(model_helper, "max_duration", None)).encode())
+    fingerprint.update(model_helper.feature_extractor.to_json_string().encode())
+    for name, tensor in model_helper.model.state_dict().items():
+        fingerprint.update(f"{name}{tensor.dtype}{tuple(tensor.shape)}".encode())
+        tensor = tensor.detach().cpu().contiguous().view(-1)
+        fingerprint.update(memoryview(tensor.view(torch.uint8).numpy()))
+
+    model_helper._model_fingerprint = fingerprint.hexdigest()
+    return model_helper._model_fingerprint
+
+
+def get_inference_mode(model_helper) -> str:
+    """
+    Inference modes that do not give the exact prediction of the model. They are part of the keys of the cached predictions.
+    """
+    modes = []
+    incremental_encoder = getattr(model_helper, "incremental_encoder", None)
+    if incremental_encoder is not None and not incremental_encoder.is_exact:
+        # The approximation depends on the reference audio
+        modes.append(f"incremental_approximate={incremental_encoder.reference_hash}")
+    precision = getattr(model_helper, "precision", "fp32")
+    if precision != "fp32":
+        modes.append(f"precision={precision}")
+    return "+".join(modes)
+
+
+def predict_logits(
+    model_helper,
+    audios: List[np.ndarray],
+    use_cache: bool = True,
+    audios_hash: Tuple[str, ...] = None,
+    predict_function: Callable = None,
+) -> np.ndarray:
+    """
+    Predicts the logits of the audios, of shape (len(audios), num_labels).
+    If the model helper has a cache (PredictionCache), only the audios that are not in the cache are predicted.
+
+    Args:
+        model_helper: model helper
+        audios: list of audios
+        use_cache: if False, the cache of the model helper is ignored
+        audios_hash: hash of the audios, if already computed (see get_audios_hash)
+        predict_function: function that predicts the logits of a list of audios (e.g., on a pool of workers). By default, the model helper predicts them in batches
+    """
+    audios = [audio.squeeze() for audio in audios]
+    if predict_function is None:
+        predict_function = partial(_predict_logits_in_batches, model_helper)
+
+    cache = getattr(model_helper, "cache", None) if use_cache else None
+    if cache is None:
+        return predict_function(audios)
+
+    if audios_hash is None:
+        audios_hash = get_audios_hash(audios)
+    model_fingerprint = get_model_fingerprint(model_helper)
+    inference_mode = get_inference_mode(model_helper)
+    keys = [
+        (model_fingerprint, inference_mode, audio_hash) for audio_hash in audios_hash
+    ]
+
+    logits = np.empty(
+        (len(audios), model_helper.model.config.num_labels), dtype=np.float32
+    )
+    # Index of the first occurrence of each audio to predict. Duplicated audios are predicted once
+    missing = {}
+    for e, key in enumerate(keys):
+        if key in missing:
+            continue
+        cached_logits = cache.get(key)
+        if cached_logits is None:
+            missing[key] = e
+        else:
+            logits[e] = cached_logits
+
+    if missing:
+        missing_idxs = list(missing.values())
+        missing_logits = predict_function([audios[e] for e in missing_idxs])
+        for e, audio_logits in zip(missing_idxs, missing_logits):
+            cache.put(keys[e], audio_logits)
+            logits[e] = audio_logits
+        for e, key in enumerate(keys):
+            if key in missing:
+                logits[e] = logits[missing[key]]
+    return logits
+
+
+def get_label_prediction_function(model_helper, label: int) -> Callable:
+    """
+    Prediction function of a single label of a multilabel model helper (as FSC).
+    The functions of the labels share the last prediction of the model helper: predicting another label
+    of the same audios does not run the model again. Each call returns a copy of the probabilities of the label.
+    """
+    if model_helper.n_labels == 1:
+        raise ValueError(
+            "The prediction function by label is supported only for multilabel model helpers (as FSC)"
+        )
+    if label not in range(model_helper.n_labels):
+        raise ValueError(f"label should be in range({model_helper.n_labels})")
+
+    def predict_label(audios: List[np.ndarray]) -> np.ndarray:
+        prediction_key = (get_inference_mode(model_helper), get_audios_hash(audios))
+        last_prediction = getattr(model_helper, "_last_prediction", None)
+        if last_prediction is None or last_prediction[0] != prediction_key:
+            last_prediction = (prediction_key, model_helper.predict(audios))
+            model_helper._last_prediction = last_prediction
+        return last_prediction[1][label].copy()
+
+    return predict_label
+
+
+def _predict_logits_in_batches(
+    model_helper, audios: List[np.ndarray], incremental: bool = True
+) -> np.ndarray:
+    """
+    If model_helper.batch_inference is False, we predict one sample at a time.
+    Otherwise, we group the audios in buckets of similar length, with at most model_helper.max_batch_samples (padded) samples, and predict one bucket at a time.
+    Within incremental_reference, the audios with the same length of the reference audio are predicted by the IncrementalFeatureEncoder.
+    """
+    logits = np.empty(
+        (len(audios), model_helper.model.config.num_labels), dtype=np.float32
+    )
+
+    incremental_encoder = (
+        getattr(model_helper, "incremental_encoder", None) if incremental else None
+    )
+    if incremental_encoder is not None:
+        incremental_idxs = [
+            e
+            for e, audio in enumerate(audios)
+            if incremental_encoder.is_applicable(audio)
+        ]
+        batch_size = (
+            max(1, model_helper.max_batch_samples // incremental_encoder.n_samples)
+            if model_helper.batch_inference
+            else 1
+        )
+        for i in range(0, len(incremental_idxs), batch_size):
+            batch = incremental_idxs[i : i + batch_size]
+            logits[batch] = incremental_encoder.predict_logits(
+                [audios[e] for e in batch]
+            )
+
+        # E.g., removal type "nothing": the audio is shorter than the reference audio
+        other_idxs = sorted(set(range(len(audios))) - set(incremental_idxs))
+        if other_idxs:
+            logits[other_idxs] = _predict_logits_in_batches(
+                model_helper, [audios[e] for e in other_idxs], incremental=False
+            )
+        return logits
+
+    if not model_helper.batch_inference:
+        for e, audio in enumerate(audios):
+            logits[e] = model_helper._predict_logits([audio])[0]
+        return logits
+
+    sampling_rate = model_helper.feature_extractor.sampling_rate
+    if getattr(model_helper, "max_duration", None) is not None:
+        # Audios are padded (or truncated) to max_duration by the feature extractor
+        lengths = [int(sampling_rate * model_helper.max_duration)] * len(audios)
+        pad_tolerance = np.inf
+    else:
+        lengths = [audio.shape[-1] for audio in audios]
+        pad_tolerance = (
+            model_helper.pad_tolerance if supports_padding(model_helper) else 0.0
+        )
+
+    for bucket in get_length_buckets(
+        lengths, model_helper.max_batch_samples, pad_tolerance
+    ):
+        logits[bucket] = model_helper._predict_logits([audios[i] for i in bucket])
+    return logits
+
+
+def check_batched_predict(
+    model_helper, audios: List[np.ndarray], atol: float = BATCH_PREDICTION_ATOL
+):
+    """
+    Compare the batched prediction with the one-at-a-time prediction.
+    Returns the maximum absolute difference of the probabilities and whether it is within atol.
+    """
+    batch_inference = model_helper.batch_inference
+    try:
+        model_helper.batch_inference = False
+        reference_logits = predict_logits(model_helper, audios, use_cache=False)
+        model_helper.batch_inference = True
+        batched_logits = predict_logits(model_helper, audios, use_cache=False)
+    finally:
+        model_helper.batch_inference = batch_inference
+
+    reference_probs = model_helper._logits_to_probs(torch.from_numpy(reference_logits))
+    batched_probs = model_helper._logits_to_probs(torch.from_numpy(batched_logits))
+
+    # Multilabel scenario as for FSC: one array of probabilities for each label
+    if not isinstance(reference_probs, tuple):
+        reference_probs, batched_probs = (reference_probs,), (batched_probs,)
+
+    max_diff = max(
+        float(np.max(np.abs(reference - batched), initial=0.0))
+        for reference, batched in zip(reference_probs, batched_probs)
+    )
+    return max_diff, max_diff <= atol
+
+
+def check_precision(precision: str):
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision should be one of {PRECISIONS}, not {precision}")
+
+
+def get_inference_device(model_helper) -> torch.device:
+    # The dynamically quantized model runs only on CPU
+    if getattr(model_helper, "precision", "fp32") == "int8":
+        return torch.device("cpu")
+    # The model helpers can be built with the device as a string (e.g., "cpu")
+    return torch.device(model_helper.device)
+
+
+def get_inference_model(model_helper):
+    """
+    Model of the forward pass of predict. With precision int8, a copy of the model with the linear layers dynamically quantized.
+    The quantized model is built once and stored in the model helper.
+    """
+    if getattr(model_helper, "precision", "fp32") != "int8":
+        return model_helper.model
+
+    if getattr(model_helper, "_quantized_model", None) is None:
+        model_helper._quantized_model = torch.ao.quantization.quantize_dynamic(
+            copy.deepcopy(model_helper.model).cpu().eval(),
+            {torch.nn.Linear},
+            dtype=torch.qint8,
+        )
+    return model_helper._quantized_model
+
+
+def get_compiled_model(model_helper):
+    """
+    torch.compile of the inference model, compiled once for each precision and stored in the model helper.
+    If the model receives the attention mask (or all the inputs are padded to max_duration, as for ITALIC),
+    the inputs are padded to a few bucketed shapes, and each shape is compiled once (see get_compile_shape).
+    Otherwise padding would change the prediction: the model is compiled with dynamic shapes.
+    """
+    if getattr(model_helper, "_compiled_models", None) is None:
+        model_helper._compiled_models = {}
+    # The inference model depends on the precision (int8 is a quantized copy on the CPU)
+    precision = getattr(model_helper, "precision", "fp32")
+    if precision not in model_helper._compiled_models:
+        dynamic = not supports_padding(model_helper) and (
+            getattr(model_helper, "max_duration", None) is None
+        )
+        model_helper._compiled_models[precision] = torch.compile(
+            get_inference_model(model_helper), dynamic=dynamic
+        )
+    return model_helper._compiled_models[precision]
+
+
+def get_compile_shape(model_helper, batch_size: int, n_samples: int) -> Tuple[int, int]:
+    """
+    Shape of the inputs of the compiled model: the batch size is rounded up to a power of two
+    and, if the model receives the attention mask, the length is padded to the shortest of model_helper.compile_durations that fits it.
+    """
+    padded_batch_size = 1 << (batch_size - 1).bit_length()
+    if not supports_padding(model_helper):
+        return padded_batch_size, n_samples
+
+    sampling_rate = model_helper.feature_extractor.sampling_rate
+    bucket_lengths = [
+        int(duration * sampling_rate) for duration in model_helper.compile_durations
+    ]
+    padded_n_samples = min(
+        [length for length in bucket_lengths if length >= n_samples],
+        default=n_samples,
+    )
+    return padded_batch_size, padded_n_samples
+
+
+def _pad_to_compile_shape(model_helper, input_values, attention_mask):
+    batch_size, n_samples = input_values.shape
+    padded_batch_size, padded_n_samples = get_compile_shape(
+        model_helper, batch_size, n_samples
+    )
+    # The samples of the batch are independent: padding rows do not change the prediction of the others
+    padded_input_values = input_values.new_zeros(padded_batch_size, padded_n_samples)
+    padded_input_values[:batch_size, :n_samples] = input_values
+    if attention_mask is not None:
+        padded_attention_mask = attention_mask.new_zeros(
+            padded_batch_size, padded_n_samples
+        )
+        padded_attention_mask[:batch_size, :n_samples] = attention_mask
+        padded_attention_mask[batch_size:] = 1
+        attention_mask = padded_attention_mask
+    return padded_input_values, attention_mask
+
+
+def forward_logits(
+    model_helper, input_values, attention_mask=None, compiled: bool = True
+) -> np.ndarray:
+    """
+    Forward pass of the model on the input values extracted by the feature extractor, in the precision of the model helper.
+    If model_helper.compile_inference (and compiled) is True, the compiled model is used (see get_compiled_model).
+    Returns the logits as a np.ndarray.
+    """
+    batch_size = input_values.shape[0]
+    model = get_inference_model(model_helper)
+    if compiled and getattr(model_helper, "compile_inference", False):
+        model = get_compiled_model(model_helper)
+        input_values, attention_mask = _pad_to_compile_shape(
+            model_helper, input_values, attention_mask
+        )
+
+    device = get_inference_device(model_helper)
+    if attention_mask is not None:
+        attention_mask = attention_mask.to(device)
+
+    if getattr(model_helper, "precision", "fp32") == "bf16":
+        autocast = torch.autocast(device.type, dtype=torch.bfloat16)
+    else:
+        autocast = nullcontext()
+
+    with torch.no_grad(), autocast:
+        logits = (
+            model(input_values.to(device), attention_mask=attention_mask)
+            .logits[:batch_size]
+            .detach()
+            .float()
+            .cpu()
+        )
+    return logits.numpy()
+
+
+def warmup_compiled_model(
+    model_helper, durations: List[float] = None, batch_sizes: List[int] = (1,)
+) -> int:
+    """
+    Compile the model for the input shapes of the given durations (by default, model_helper.compile_durations) and batch sizes,
+    so that the compilation does not happen during the explanations.
+    Returns the number of input shapes.
+    """
+    if not getattr(model_helper, "compile_inference", False):
+        raise ValueError(
+            "The model helper does not use the compiled model (compile_inference=False)"
+        )
+
+    if getattr(model_helper, "max_duration", None) is not None:
+        # All the audios are padded to max_duration
+        durations = [model_helper.max_duration]
+    elif durations is None:
+        durations = model_helper.compile_durations
+
+    sampling_rate = model_helper.feature_extractor.sampling_rate
+    shapes = set()
+    for duration in durations:
+        n_samples = int(duration * sampling_rate)
+        for batch_size in batch_sizes:
+            inputs = model_helper._extract_features(
+                [np.zeros(n_samples, dtype=np.float32)] * batch_size
+            )
+            shape = get_compile_shape(
+                model_helper, batch_size, inputs.input_values.shape[-1]
+            )
+            if shape not in shapes:
+                forward_logits(
+                    model_helper,
+                    inputs.input_values,
+                    inputs.get("attention_mask", None),
+                )
+                shapes.add(shape)
+    return len(shapes)
+
+
+@contextmanager
+def incremental_reference(model_helper, reference_audio: np.ndarray):
+    """
+    Within the context, the audios with the same length of reference_audio (e.g., the audio with a word replaced by silence)
+    are predicted by recomputing only the frames of the feature encoder affected by the changed spans (see IncrementalFeatureEncoder).
+    It has no effect if model_helper.incremental_encoding is False.
+    """
+    if not getattr(model_helper, "incremental_encoding", False):
+        yield
+    else:
+        from speechxai.model_helpers.incremental_encoder import (
+            IncrementalFeatureEncoder,
+        )
+
+        previous_encoder = model_helper.incremental_encoder
+        model_helper.incremental_encoder = IncrementalFeatureEncoder(
+            model_helper,
+            reference_audio,
+            approximate=model_helper.incremental_approximate,
+        )
+        try:
+            yield
+        finally:
+            model_helper.incremental_encoder = previous_encoder
+
+
+def check_incremental_predict(
+    model_helper,
+    reference_audio: np.ndarray,
+    audios: List[np.ndarray],
+    atol: float = BATCH_PREDICTION_ATOL,
+):
+    """
+    Compare the incremental prediction of the audios (perturbations of reference_audio, with the same length) with the full prediction.
+    Returns the maximum absolute difference of the probabilities and whether it is within atol.
+    """
+    from speechxai.model_helpers.incremental_encoder import IncrementalFeatureEncoder
+
+    audios = [audio.squeeze() for audio in audios]
+    reference_logits = _predict_logits_in_batches(
+        model_helper, audios, incremental=False
+    )
+    incremental_encoder = IncrementalFeatureEncoder(
+        model_helper, reference_audio, approximate=True
+    )
+    incremental_logits = incremental_encoder.predict_logits(audios)
+
+    reference_probs = model_helper._logits_to_probs(torch.from_numpy(reference_logits))
+    incremental_probs = model_helper._logits_to_probs(
+        torch.from_numpy(incremental_logits)
+    )
+
+    # Multilabel scenario as for FSC: one array of probabilities for each label
+    if not isinstance(reference_probs, tuple):
+        reference_probs, incremental_probs = (reference_probs,), (incremental_probs,)
+
+    max_diff = max(
+        float(np.max(np.abs(reference - incremental), initial=0.0))
+        for reference, incremental in zip(reference_probs, incremental_probs)
+    )
+    return max_diff, max_diff <= atol
+
+
+def check_precision_predict(
+    model_helper, audios: List[np.ndarray], precision: str = "int8"
+) -> Dict[str, float]:
+    """
+    Compare the prediction in the given precision with the fp32 prediction.
+    Returns the maximum and mean absolute difference of the probabilities and the agreement of the predicted classes.
+    """
+    check_precision(precision)
+    model_precision = model_helper.precision
+    try:
+        model_helper.precision = "fp32"
+        reference_logits = predict_logits(model_helper, audios, use_cache=False)
+        model_helper.precision = precision
+        reduced_logits = predict_logits(model_helper, audios, use_cache=False)
+    finally:
+        model_helper.precision = model_precision
+
+    reference_probs = model_helper._logits_to_probs(torch.from_numpy(reference_logits))
+    reduced_probs = model_helper._logits_to_probs(torch.from_numpy(reduced_logits))
+
+    # Multilabel scenario as for FSC: one array of probabilities for each label
+    if not isinstance(reference_probs, tuple):
+        reference_probs, reduced_probs = (reference_probs,), (reduced_probs,)
+
+    diffs = np.concatenate(
+        [
+            np.abs(reference - reduced).ravel()
+            for reference, reduced in zip(reference_probs, reduced_probs)
+        ]
+    )
+    agreement = np.mean(
+        [
+            np.mean(reference.argmax(-1) == reduced.argmax(-1))
+            for reference, reduced in zip(reference_probs, reduced_probs)
+        ]
+    )
+    return {
+        "max_abs_diff": float(diffs.max(initial=0.0)),
+        "mean_abs_diff": float(diffs.mean()) if len(diffs) > 0 else 0.0,
+        "class_agreement": float(agreement),
+    }
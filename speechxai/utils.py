@@ -1,12 +1,9 @@
-from datasets import Dataset
-import pandas as pd
 import pydub
 import numpy as np
 import os
 from pathlib import Path
 from typing import Tuple
 import torch
-from transformers import Wav2Vec2ForSequenceClassification, Wav2Vec2FeatureExtractor
 
 
 def pydub_to_np(audio: pydub.AudioSegment) -> Tuple[np.ndarray, int]:
@@ -16,15 +13,28 @@ def pydub_to_np(audio: pydub.AudioSegment) -> Tuple[np.ndarray, int]:
     Returns tuple (audio_np_array, sample_rate).
     """
 
+    if audio.sample_width in (1, 2, 4):
+        # View of the raw data (no copy), converted and scaled in a single allocation
+        samples = np.frombuffer(audio.raw_data, dtype=f"<i{audio.sample_width}")
+    else:
+        samples = np.array(audio.get_array_of_samples())
+
     return (
-        np.array(audio.get_array_of_samples(), dtype=np.float32).reshape(
-            (-1, audio.channels)
-        )
-        / (1 << (8 * audio.sample_width - 1)),
+        np.multiply(
+            samples.reshape((-1, audio.channels)),
+            1.0 / (1 << (8 * audio.sample_width - 1)),
+            dtype=np.float32,
+        ),
         audio.frame_rate,
     )
 
 
+def set_seed(seed: int):
+    torch.manual_seed(seed)
+    torch.cuda.manual_seed(seed)
+    np.random.seed(seed)
+
+
 def print_log(*args):
     # This is just a wrapper to easily spot the print :) - I use it to debug
     print(args)
@@ -170,6 +180,10 @@ def plot_word_importance_summary(
 
 
 def load_dataset_and_model(dataset_name, data_dir, model_dir=None, model_name=None):
+    from datasets import Dataset
+    import pandas as pd
+    from transformers import Wav2Vec2ForSequenceClassification, Wav2Vec2FeatureExtractor
+
     if dataset_name == "FSC":
         ## Load audio
 